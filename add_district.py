@@ -26,73 +26,24 @@ lara_name_out = "data/LARA_with_coord_and_legislative_district1.csv"
 #######################################################################################
 
 import pandas as pd
-import geopandas as gpd
-import numpy as np
-import shapely
-from shapely.geometry import Point
-import geopy
 
+from districting import add_districts
 
-def find_district(geojson_file, coordinates):
-    # Load the GeoJSON file into a GeoDataFrame
-    gdf = gpd.read_file(geojson_file)
-    
-    # Create a Point geometry from the coordinates
-    point = Point(coordinates)
-    
-    # Check each district for a containing point
-    for _, row in gdf.iterrows():  # We use iterrows() here to get the row as a Series
-        # If the point is within the polygon of this row, return the label
-        if point.within(row['geometry']):
-            return row['LABEL']
-    return None  # Return None or an appropriate value if the point isn't in any district
+# output column -> (boundary file, district id property)
+boundaries = {
+    "House district": (house_districts_geojson_path, "LABEL"),
+    "Senate district": (senate_districts_geojson_path, "LABEL"),
+}
 
 #read data
 mhvillage_df = pd.read_csv(path2folder + mhvillage_name)
 lara_df = pd.read_csv(path2folder + lara_name)
 
-#create columns
-sLength = len(mhvillage_df['Longitude'])
-mhvillage_df['House district'] = pd.Series(np.zeros(sLength), index=mhvillage_df.index)
-mhvillage_df['Senate district'] = pd.Series(np.zeros(sLength), index=mhvillage_df.index)
-
-
-for ind in range(len(mhvillage_df)):
-    lon = float(mhvillage_df['longitude'].iloc[ind])
-    lat = float(mhvillage_df['latitude'].iloc[ind])
-    if lat and lon:
-            # Check the legislative district
-    	district_house = find_district(house_districts_geojson_path, (lon,lat))
-    	district_senate = find_district(senate_districts_geojson_path, (lon,lat))
-    	if district_senate and district_house:
-    		print(district_senate)
-    		print(district_house)
-    		mhvillage_df.loc[ind,'House district'] = int(district_house)
-    		mhvillage_df.loc[ind,'Senate district'] = int(district_senate)
-
-
-
+# each boundary file is read once and matched against every row in one pass
+mhvillage_df = add_districts(mhvillage_df, boundaries)
 mhvillage_df.to_csv(mhvillage_name_out) 
 
 #Now LARA
 
-sLength = len(lara_df['longitude'])
-lara_df['House district'] = pd.Series(np.zeros(sLength), index=lara_df.index)
-lara_df['Senate district'] = pd.Series(np.zeros(sLength), index=lara_df.index)
-
-for ind in range(len(lara_df)):
-    lon = float(lara_df['longitude'].iloc[ind])
-    lat = float(lara_df['latitude'].iloc[ind])
-    if lat and lon:
-            # Check the legislative district
-    	district_house = find_district( house_districts_geojson_path, (lon,lat))
-    	district_senate = find_district(senate_districts_geojson_path,(lon,lat))
-    	if district_senate and district_house:
-    		print(district_senate)
-    		print(district_house)
-    		lara_df.loc[ind,'House district'] = int(district_house)
-    		lara_df.loc[ind,'Senate district'] = int(district_senate)
-
+lara_df = add_districts(lara_df, boundaries)
 lara_df.to_csv(lara_name_out)
-
- 
\ No newline at end of file
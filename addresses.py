@@ -0,0 +1,117 @@
+# addresses.py
+# Canonical forms of street addresses, so that rows which only differ in case,
+# punctuation, spacing or USPS abbreviations ("Road" vs "Rd", "North" vs "N")
+# are recognised as the same place and geocoded once. Everything works on a
+# whole Series at a time.
+import re
+
+import numpy as np
+import pandas as pd
+
+# USPS street suffix abbreviations (Publication 28, Appendix C1), common ones.
+SUFFIXES = {
+    "ALLEY": "ALY",
+    "AVENUE": "AVE",
+    "AV": "AVE",
+    "BOULEVARD": "BLVD",
+    "CIRCLE": "CIR",
+    "COURT": "CT",
+    "COVE": "CV",
+    "CROSSING": "XING",
+    "DRIVE": "DR",
+    "ESTATES": "ESTS",
+    "EXPRESSWAY": "EXPY",
+    "HEIGHTS": "HTS",
+    "HIGHWAY": "HWY",
+    "HWAY": "HWY",
+    "LAKE": "LK",
+    "LANE": "LN",
+    "MEADOWS": "MDWS",
+    "PARKWAY": "PKWY",
+    "PLACE": "PL",
+    "POINT": "PT",
+    "ROAD": "RD",
+    "ROUTE": "RTE",
+    "SQUARE": "SQ",
+    "STREET": "ST",
+    "STR": "ST",
+    "TERRACE": "TER",
+    "TRAIL": "TRL",
+    "TURNPIKE": "TPKE",
+    "VILLAGE": "VLG",
+}
+DIRECTIONS = {
+    "NORTH": "N",
+    "SOUTH": "S",
+    "EAST": "E",
+    "WEST": "W",
+    "NORTHEAST": "NE",
+    "NORTHWEST": "NW",
+    "SOUTHEAST": "SE",
+    "SOUTHWEST": "SW",
+}
+# Unit designators (USPS Appendix C2).
+UNITS = {"APARTMENT": "APT", "SUITE": "STE"}
+
+_ABBREVIATIONS = {**SUFFIXES, **DIRECTIONS, **UNITS}
+_WORDS = re.compile(r"\b(" + "|".join(sorted(_ABBREVIATIONS, key=len, reverse=True)) + r")\b")
+
+
+def normalize_addresses(addresses):
+    """Upper-case, punctuation-free, single-spaced addresses with USPS
+    abbreviations, e.g. "123 North Main Road, Apt. 4" -> "123 N MAIN RD APT 4".
+    Missing addresses stay missing."""
+    out = addresses.astype("string").str.upper()
+    out = out.str.replace(r"[^\w\s#]", " ", regex=True)
+    out = out.str.replace(_WORDS, lambda m: _ABBREVIATIONS[m.group(1)], regex=True)
+    out = out.str.replace(r"\s+", " ", regex=True).str.strip()
+    return out.mask(out == "")
+
+
+def normalize_zips(zips):
+    """Five-digit ZIP strings: 601.0 -> "00601", "62701-1234" -> "62701"."""
+    text = zips.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+    digits = text.str.extract(r"^(\d{1,5})", expand=False)
+    return digits.str.zfill(5)
+
+
+def address_keys(df, address_col, city_state_col=None, zip_col=None):
+    """One canonical key per row; rows with equal keys are the same address.
+    A missing part is left empty, and the key is missing only when every part
+    is."""
+    parts = [normalize_addresses(df[address_col])]
+    if city_state_col:
+        parts.append(normalize_addresses(df[city_state_col]))
+    if zip_col:
+        parts.append(normalize_zips(df[zip_col]))
+    key = parts[0].fillna("")
+    for part in parts[1:]:
+        key = key + "|" + part.fillna("")
+    return key.mask(pd.concat(parts, axis=1).isna().all(axis=1))
+
+
+def address_groups(keys):
+    """(group id per row; number of groups). Rows with a missing key say
+    nothing about where they are, so each gets a group of its own."""
+    codes, uniques = pd.factorize(keys, use_na_sentinel=True)
+    missing = codes == -1
+    codes[missing] = len(uniques) + np.arange(missing.sum())
+    return pd.Series(codes, index=keys.index), len(uniques) + int(missing.sum())
+
+
+if __name__ == "__main__":
+    # Rows without a street are still told apart by city/state and ZIP, and
+    # rows with no address at all are never grouped together.
+    df = pd.DataFrame(
+        {
+            "Address": [",", ",", "12 North Main Road", "12 N. Main Rd", None, None],
+            "City State": ["1522 Wilkes Ave, IL", "Swansea, IL", "Quincy, IL", "quincy IL", None, None],
+            "ZIP": [62305.0, 62226.0, 62301.0, 62301.0, None, None],
+        }
+    )
+    groups, n_unique = address_groups(address_keys(df, "Address", "City State", "ZIP"))
+    assert groups[0] != groups[1], "rows without a street merged"
+    assert groups[2] == groups[3], "same address not merged"
+    assert groups[4] != groups[5], "rows without an address merged"
+    assert n_unique == 5
+    print(f"{len(df)} addresses, {n_unique} unique: {groups.tolist()}")
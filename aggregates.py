@@ -0,0 +1,185 @@
+# aggregates.py
+# Rollup cube of the per-region statistics behind the infographics, their
+# downloads and the table summary. It is built once per data version and kept
+# on disk next to the table snapshots.
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import data_version, get, register, snapshot_dir
+from districting import district_at
+from region_index import GEOGRAPHIES, SOURCES, region_key, region_rows
+
+# Bump when _rollup or build_cube changes so that old cubes are rebuilt.
+CUBE_VERSION = 1
+
+# source -> (site count column, average rent column or None)
+MEASURES = {
+    "LARA": ("Total_#_Sites", None),
+    "MHVillage": ("Sites", "Average_rent"),
+}
+
+
+def _rollup(df, sites_col, rent_col, geography):
+    sites = df[sites_col].astype("float64")
+    rent = df[rent_col].astype("float64") if rent_col else pd.Series(np.nan, index=df.index)
+    both = sites.notna() & rent.notna()
+
+    cells = pd.DataFrame(
+        {
+            "communities": 1,
+            "communities_with_sites": sites.notna().astype("int64"),
+            "total_sites": sites.fillna(0),
+            "rent": rent,
+            "rent_count": rent.notna().astype("int64"),
+            "rent_x_sites": (rent * sites).where(both, 0.0),
+            "rented_sites": sites.where(both, 0.0),
+        }
+    ).groupby(df[geography], observed=True)
+
+    out = cells.agg(
+        communities=("communities", "sum"),
+        communities_with_sites=("communities_with_sites", "sum"),
+        total_sites=("total_sites", "sum"),
+        mean_rent=("rent", "mean"),
+        rent_count=("rent_count", "sum"),
+        rent_x_sites=("rent_x_sites", "sum"),
+        rented_sites=("rented_sites", "sum"),
+    )
+    out["total_sites"] = out["total_sites"].astype("int64")
+    out["weighted_rent"] = out["rent_x_sites"] / out["rented_sites"].replace(0, np.nan)
+    out = out.drop(columns=["rent_x_sites", "rented_sites"])
+    out.index = out.index.map(region_key).rename("region")
+    return out
+
+
+def build_cube(frames):
+    """Aggregate every (source, geography, region) cell of `frames`
+    ({source: DataFrame}) into one frame indexed by those three levels."""
+    parts = {}
+    for source, df in frames.items():
+        sites_col, rent_col = MEASURES[source]
+        for geography in GEOGRAPHIES:
+            parts[(source, geography)] = _rollup(df, sites_col, rent_col, geography)
+    cube = pd.concat(parts, names=["source", "geography", "region"])
+    return cube.sort_index()
+
+
+def _load():
+    path = snapshot_dir / f"cube-v{CUBE_VERSION}-{data_version()}.parquet"
+    try:
+        return pd.read_parquet(path)
+    except (ImportError, OSError, ValueError):
+        pass
+
+    cube = build_cube({source: get(name) for source, name in SOURCES.items()})
+    try:
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        cube.to_parquet(tmp)
+        os.replace(tmp, path)
+        # Cubes of older data or code are never read again.
+        for old in snapshot_dir.glob("cube-*.parquet"):
+            if old != path:
+                old.unlink(missing_ok=True)
+    except (ImportError, OSError, ValueError):
+        pass
+    return cube
+
+
+register("cube", _load)
+
+
+def cube_slice(source, geography):
+    """Cells of one source and geography, indexed by region."""
+    return get("cube").loc[(source, geography)]
+
+
+def region_summary(source, geography, region):
+    """Number of communities with a site count, and their total sites."""
+    try:
+        cell = get("cube").loc[(source, geography, str(region))]
+    except KeyError:
+        return 0, 0
+    return int(cell["communities_with_sites"]), int(cell["total_sites"])
+
+
+def county_sites_table():
+    """LARA counties by total number of sites, largest first."""
+    cells = cube_slice("LARA", "County")
+    cells = cells[cells["communities_with_sites"] > 0]
+    return (
+        cells["total_sites"]
+        .rename("Number of Sites")
+        .rename_axis("County")
+        .reset_index()
+        .sort_values("Number of Sites", ascending=False)
+    )
+
+
+def county_rent_table():
+    """MHVillage counties with their mean rent and the number of communities
+    that reported one, most reports first."""
+    cells = cube_slice("MHVillage", "County")
+    cells = cells[cells["rent_count"] > 0]
+    return (
+        cells[["mean_rent", "rent_count"]]
+        .rename(columns={"mean_rent": "Average_rent", "rent_count": "count"})
+        .rename_axis("County")
+        .reset_index()
+        .sort_values("Average_rent", ascending=True)
+        .sort_values("count", ascending=False, kind="stable")
+    )
+
+
+def community_list(source, geography, region):
+    """Name, address and number of sites of every community `source` lists in
+    a region; LARA's name is the DBA, or the owner where there is none."""
+    df = region_rows(source, geography, region)
+    if source == "LARA":
+        dba = df["DBA"].astype("string")
+        name = dba.where(dba.str.strip().fillna("") != "", df["Owner / Community_Name"].astype("string"))
+        address, sites = df["Location_Address"], df["Total_#_Sites"]
+    else:
+        name, address, sites = df["Name"], df["FullstreetAddress"], df["Sites"]
+    return pd.DataFrame(
+        {
+            "Name": name,
+            "Address": address,
+            "Number of Sites": pd.to_numeric(sites, errors="coerce").astype("Int64"),
+        }
+    ).reset_index(drop=True)
+
+
+def district_summary(lat, lon):
+    """The House and Senate district at a point, with the number of communities
+    and sites each source lists in them."""
+    rows = []
+    for geography, district in district_at(lat, lon).items():
+        for source in SOURCES:
+            num_mhcs, num_sites = region_summary(source, geography, district) if district else (0, 0)
+            rows.append(
+                {
+                    "District": f"{geography} {district}" if district else f"{geography}: none",
+                    "Source": source,
+                    "Number of MHC's": num_mhcs,
+                    "# of Sites": num_sites,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def district_communities(lat, lon):
+    """The communities each source lists in the House and Senate district at a
+    point, one row per (district, source, community)."""
+    frames = [
+        community_list(source, geography, district).assign(District=f"{geography} {district}", Source=source)
+        for geography, district in district_at(lat, lon).items()
+        if district
+        for source in SOURCES
+    ]
+    columns = ["District", "Source", "Name", "Address", "Number of Sites"]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)[columns]
@@ -2,5 +2,6 @@
 from shiny import App
 from ui_layout import app_ui
 from server import server
+from tile_server import mount
 
-app = App(app_ui, server, debug=True)
\ No newline at end of file
+app = mount(App(app_ui, server, debug=True))
@@ -0,0 +1,63 @@
+"""
+Benchmark: "Circle ... (location only)" layers, one L.Circle widget per
+community vs. one GeoJSON point layer.
+
+For each source this reports the number of widgets (comm models) the layer
+needs, the bytes of widget state sent to the browser when it is displayed, and
+the server-side time to build and serialize that state. Time to first paint
+can't be measured without a browser; the bytes and widget count are what drive
+it.
+
+Run from the repository root:
+    python benchmarks/bench_circles.py
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ipyleaflet as L
+
+from data_store import get
+from map_layers import build_circle_layer, marker_frame
+
+
+def _state_bytes(widget):
+    return len(json.dumps(widget.get_state(), default=str).encode())
+
+
+def legacy_circle_layer(LARA_C):
+    color = "blue" if LARA_C else "orange"
+    frame = marker_frame(get("lara") if LARA_C else get("mhvillage"), LARA_C)
+    circles = [
+        L.Circle(location=(lat, lon), radius=1, color=color, fill_color=color)
+        for lat, lon in zip(frame["latitude"].tolist(), frame["longitude"].tolist())
+    ]
+    return L.LayerGroup(name="location circles", layers=circles), circles
+
+
+def measure_legacy(LARA_C):
+    start = time.perf_counter()
+    group, circles = legacy_circle_layer(LARA_C)
+    nbytes = _state_bytes(group) + sum(_state_bytes(c) for c in circles)
+    seconds = time.perf_counter() - start
+    return len(circles) + 1, nbytes, seconds
+
+
+def measure_geojson(LARA_C):
+    start = time.perf_counter()
+    layer = build_circle_layer(LARA_C)
+    nbytes = _state_bytes(layer)
+    seconds = time.perf_counter() - start
+    return 1, nbytes, seconds
+
+
+if __name__ == "__main__":
+    print(f"{'layer':<22}{'version':<10}{'widgets':>9}{'bytes':>11}{'build_s':>10}")
+    for name, LARA_C in (("Circle MHVillage", 0), ("Circle LARA", 1)):
+        for version, measure in (("L.Circle", measure_legacy), ("GeoJSON", measure_geojson)):
+            widgets, nbytes, seconds = measure(LARA_C)
+            print(f"{name:<22}{version:<10}{widgets:>9}{nbytes:>11}{seconds:>10.3f}")
@@ -0,0 +1,73 @@
+"""
+Benchmark: district lookup by raster grid vs. the STRtree join.
+
+For every boundary set used by add_district.py and il_add_district.py that is
+present, builds a districting.DistrictGrid and resolves the same points with
+it and with districting.find_districts:
+    1) every community of the state (LARA and MHVillage for Michigan)
+    2) a million uniform random points over the boundaries' extent
+    3) every boundary vertex, i.e. points exactly on a district edge
+The two must agree on every point. Reports the build time, the lookup time of
+both methods and the share of grid cells that need the exact test.
+
+Run from the repository root:
+    python benchmarks/bench_district_grid.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from data_store import get
+from districting import MICHIGAN, ILLINOIS, DistrictGrid, find_districts, load_boundaries
+
+
+# state -> datasets with its communities
+COMMUNITIES = {"MI": ["lara", "mhvillage"], "IL": ["mhvillage_il"]}
+
+
+def point_sets(state, path, id_column):
+    geoms, _, _ = load_boundaries(str(path), id_column)
+    x0, y0, x1, y1 = shapely.total_bounds(geoms)
+    rng = np.random.default_rng(0)
+    communities = pd.concat([get(name)[["longitude", "latitude"]] for name in COMMUNITIES[state]])
+    vertices = shapely.get_coordinates(shapely.boundary(geoms))
+    return {
+        "communities": (communities["longitude"].to_numpy("float64"), communities["latitude"].to_numpy("float64")),
+        "random 1M": (rng.uniform(x0, x1, 1_000_000), rng.uniform(y0, y1, 1_000_000)),
+        "edge vertices": (vertices[:, 0], vertices[:, 1]),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def run(state, column, path, id_column):
+    grid, build_s = timed(DistrictGrid, path, id_column)
+    print(f"\n{state} {column}: grid {grid.grid.shape[1]}x{grid.grid.shape[0]}, built in {build_s:.2f}s, "
+          f"{(grid.grid == -2).mean():.1%} of cells on an edge")
+    print(f"{'points':<16}{'n':>10}{'strtree_s':>12}{'grid_s':>10}{'speedup':>10}  agree")
+    for label, (lon, lat) in point_sets(state, path, id_column).items():
+        expected, tree_s = timed(find_districts, lon, lat, path, id_column)
+        got, grid_s = timed(grid.find_districts, lon, lat)
+        agree = bool((expected == got).all())
+        print(f"{label:<16}{len(lon):>10}{tree_s:>12.4f}{grid_s:>10.4f}{tree_s / grid_s:>9.1f}x  {agree}")
+        assert agree, f"grid and STRtree disagree on {label}"
+
+
+if __name__ == "__main__":
+    for state, boundaries in (("MI", MICHIGAN), ("IL", ILLINOIS)):
+        for column, (path, id_column) in boundaries.items():
+            if not Path(path).exists():
+                print(f"\n{state} {column}: {path} not found, skipped")
+                continue
+            run(state, column, path, id_column)
@@ -0,0 +1,124 @@
+"""
+Benchmark: marker titles and coordinates, row loop vs. vectorized.
+
+Compares the per-row loop build_marker_layer used to run (kept below as
+`legacy_marker_rows`) with map_layers.marker_frame on the LARA and MHVillage
+frames and on a synthetic 50k-row MHVillage-shaped frame. Both must produce the
+same markers. The "with widgets" rows add the L.Marker construction that both
+versions share.
+
+Run from the repository root:
+    python benchmarks/bench_markers.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import ipyleaflet as L
+
+from data_store import get
+from map_layers import marker_frame
+
+
+# -----------------------------
+# The loop being replaced
+# -----------------------------
+def legacy_marker_rows(df, LARA_C):
+    rows = []
+    for ind in range(len(df)):
+        lon = float(df["longitude"].iloc[ind])
+        lat = float(df["latitude"].iloc[ind])
+        if lon == 0 and lat == 0:
+            continue
+
+        if pd.isna(df["House district"].iloc[ind]) or pd.isna(df["Senate district"].iloc[ind]):
+            house = "missing"
+            senate = "missing"
+        else:
+            house = int(df["House district"].iloc[ind])
+            senate = int(df["Senate district"].iloc[ind])
+
+        sites_col = "Total_#_Sites" if LARA_C else "Sites"
+        if pd.isna(df[sites_col].iloc[ind]):
+            sites = "missing"
+        else:
+            sites = round(df[sites_col].iloc[ind])
+
+        if LARA_C:
+            title = (
+                str(df["Owner / Community_Name"].iloc[ind])
+                + " , number of sites: " + str(sites)
+                + " , House district: " + str(house)
+                + " , Senate district: " + str(senate)
+                + ", LARA"
+            )
+        else:
+            title = (
+                str(df["Name"].iloc[ind])
+                + " , number of sites: " + str(sites)
+                + " , average rent: " + str(df["Average_rent"].iloc[ind])
+                + " , House district: " + str(house)
+                + " , Senate district: " + str(senate)
+                + " , url: %s" % str(df["Url"].iloc[ind])
+                + " , MHVillage"
+            )
+        rows.append((lat, lon, title))
+    return rows
+
+
+def vectorized_marker_rows(df, LARA_C):
+    frame = marker_frame(df, LARA_C)
+    return list(zip(frame["latitude"].tolist(), frame["longitude"].tolist(), frame["title"].tolist()))
+
+
+def to_markers(rows):
+    markers = [L.Marker(location=(lat, lon), draggable=False, title=title) for lat, lon, title in rows]
+    # Closing unregisters the widgets, so later runs don't pay for a growing registry.
+    for marker in markers:
+        marker.close()
+
+
+# -----------------------------
+# Timing
+# -----------------------------
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def check_same(legacy, vectorized):
+    # The loop let NaN coordinates through; the vectorized version drops them.
+    legacy = [row for row in legacy if row[0] == row[0] and row[1] == row[1]]
+    assert legacy == vectorized, "vectorized markers differ from the loop"
+
+
+def run_case(name, df, LARA_C, repeat, widgets):
+    check_same(legacy_marker_rows(df, LARA_C), vectorized_marker_rows(df, LARA_C))
+    loop_s = best_of(lambda: legacy_marker_rows(df, LARA_C), repeat)
+    vec_s = best_of(lambda: vectorized_marker_rows(df, LARA_C), repeat)
+    print(f"{name:<28}{len(df):>8}{loop_s:>12.4f}{vec_s:>12.4f}{loop_s / vec_s:>9.1f}x")
+
+    if widgets:
+        loop_s = best_of(lambda: to_markers(legacy_marker_rows(df, LARA_C)), 3)
+        vec_s = best_of(lambda: to_markers(vectorized_marker_rows(df, LARA_C)), 3)
+        print(f"{'  with widgets':<28}{'':>8}{loop_s:>12.4f}{vec_s:>12.4f}{loop_s / vec_s:>9.1f}x")
+
+
+if __name__ == "__main__":
+    lara = get("lara")
+    mhvillage = get("mhvillage")
+    synthetic = mhvillage.sample(50_000, replace=True, random_state=0).reset_index(drop=True)
+
+    print(f"{'frame':<28}{'rows':>8}{'loop_s':>12}{'vector_s':>12}{'speedup':>10}")
+    run_case("LARA", lara, 1, repeat=5, widgets=True)
+    run_case("MHVillage", mhvillage, 0, repeat=5, widgets=True)
+    run_case("synthetic MHVillage", synthetic, 0, repeat=1, widgets=False)
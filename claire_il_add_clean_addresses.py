@@ -5,6 +5,8 @@ It performs:
     1) First-pass geocoding
     2) Retry missing using same address
     3) Retry missing using full address (street + city/state + ZIP)
+       (geocode_with_cascade does 1-3 in one pass, adding a punctuation-free
+       and a ZIP-centroid attempt)
     4) Export remaining missing rows for manual fix
     5) Merge manually entered coordinates back into the main file
 """
@@ -12,12 +14,24 @@ It performs:
 # -----------------------------
 # Imports
 # -----------------------------
+import numpy as np
 import pandas as pd
 from geopy.geocoders import Nominatim
 from pathlib import Path
-from tqdm import tqdm
 
-tqdm.pandas(dynamic_ncols=True)
+from geocode_pipeline import (
+    GeocodeJournal,
+    ProviderMetrics,
+    geocode_cascade,
+    geocode_rows,
+    journal_path,
+    print_metrics,
+    provider_name,
+    write_csv_atomic,
+)
+from geocoding import CachedGeocoder
+
+geolocator = CachedGeocoder(Nominatim(user_agent="yyushan@umich.edu"))
 
 
 # -----------------------------
@@ -27,7 +41,6 @@ tqdm.pandas(dynamic_ncols=True)
 Reference: https://towardsdatascience.com/transform-messy-address-into-clean-data-effortlessly-using-geopy-and-python-d3f726461225
 """
 def extract_clean_address(address):
-    geolocator = Nominatim(user_agent="yyushan@umich.edu")
     try:
         location = geolocator.geocode(address)
         return location.address if location else None
@@ -36,8 +49,6 @@ def extract_clean_address(address):
 
 
 def extract_lat_long(address):
-    geolocator = Nominatim(user_agent="yyushan@umich.edu")
-
     try:
         location = geolocator.geocode(address)
         if location is None:
@@ -59,47 +70,94 @@ def get_coordinates(data_dir, input_file, address_col, output_file):
 
     print("\nExtracting GPS coordinates...")
 
-    df["lat_long"] = df[address_col].progress_apply(extract_lat_long)
+    # Every answer goes to the journal as it arrives, so an interrupted run
+    # picks up where it stopped. Concurrent requests, still at most 1 per
+    # second as Nominatim asks.
+    journal = GeocodeJournal(journal_path(output_path))
+    metrics = ProviderMetrics(provider_name(geolocator))
+    answers = geocode_rows(df[address_col], geolocator, journal, metrics=metrics, rate=1.0, concurrency=4)
+    df["latitude"] = df["longitude"] = np.nan
+    _apply_answers(df, answers)
+    print_metrics(metrics)
+
+    write_csv_atomic(df, output_path)
+    journal.remove()
+    print(f"\nDone! Saved output to: {output_path}")
+
+
+def geocode_with_cascade(
+    input_file,
+    output_file,
+    address_col="Address",
+    city_state_col="City State",
+    zip_col="ZIP",
+):
+    """Steps 1-3 in one pass: each row tries the address as given, without
+    punctuation, as "street, city_state, ZIP", then the ZIP code alone, and
+    stops at the first that resolves it. geocode_strategy records which one
+    did (zip_centroid rows are only placed at their ZIP code)."""
+    output_path = Path(output_file)
+    df = pd.read_csv(input_file)
 
-    # Handle None values safely
-    df["latitude"] = df["lat_long"].apply(lambda x: x[0] if isinstance(x, list) else None)
-    df["longitude"] = df["lat_long"].apply(lambda x: x[1] if isinstance(x, list) else None)
+    journal = GeocodeJournal(journal_path(output_path))
+    columns = {"address": address_col, "city_state": city_state_col, "zip": zip_col}
+    metrics = ProviderMetrics(provider_name(geolocator))
+    coords, stats = geocode_cascade(df, geolocator, journal, columns, metrics=metrics, rate=1.0, concurrency=4)
+    df[["latitude", "longitude", "geocode_strategy"]] = coords
+    print_metrics(metrics)
 
-    df.drop(columns=["lat_long"], inplace=True)
+    print("\nRows resolved per strategy:")
+    print(stats.to_string(index=False))
 
-    df.to_csv(output_path, index=False)
+    write_csv_atomic(df, output_path)
+    journal.remove()
     print(f"\nDone! Saved output to: {output_path}")
 
 
-def fill_missing_coordinates(csv_path, address_col, max_loops=10):
+def _apply_answers(df, answers):
+    """Write found coordinates into df; return how many rows got one."""
+    fixed = 0
+    for idx, point in answers.items():
+        if point is not None:
+            df.at[idx, "latitude"], df.at[idx, "longitude"] = point
+            fixed += 1
+    return fixed
+
 
+def _missing_coordinates(df):
+    # Treat NaN, empty string, and "Not found" as missing
+    lat_str = df["latitude"].astype(str).str.strip().str.lower()
+    lon_str = df["longitude"].astype(str).str.strip().str.lower()
+    return (
+        df["latitude"].isna()
+        | df["longitude"].isna()
+        | lat_str.isin(["", "nan", "not found"])
+        | lon_str.isin(["", "nan", "not found"])
+    )
+
+
+def fill_missing_coordinates(csv_path, address_col, max_loops=10):
+    # Read once; each loop journals its answers and the CSV is written once,
+    # atomically, at the end. Rerun after a crash to resume from the journal.
     csv_path = Path(csv_path)
+    df = pd.read_csv(csv_path)
+    journal = GeocodeJournal(journal_path(csv_path))
 
     for loop in range(1, max_loops + 1):
-        df = pd.read_csv(csv_path)
-
         # Identify missing lat/long
         missing_mask = df["latitude"].isna() | df["longitude"].isna()
         missing_count = missing_mask.sum()
 
         if missing_count == 0:
             print(f"\nNo missing coordinates left. All done after {loop-1} loops!")
-            return
+            break
 
         print(f"\nLoop {loop}: {missing_count} rows still missing coords...")
 
-        fixed_this_round = 0
-
-        for idx in tqdm(df[missing_mask].index, total=missing_count):
-            addr = df.at[idx, address_col]
-            result = extract_lat_long(addr)
-
-            if isinstance(result, list):
-                df.at[idx, "latitude"] = result[0]
-                df.at[idx, "longitude"] = result[1]
-                fixed_this_round += 1
-
-        df.to_csv(csv_path, index=False)
+        metrics = ProviderMetrics(provider_name(geolocator))
+        answers = geocode_rows(df.loc[missing_mask, address_col], geolocator, journal, metrics=metrics, rate=1.0)
+        fixed_this_round = _apply_answers(df, answers)
+        print_metrics(metrics)
         print(f" → Loop {loop} fixed {fixed_this_round} rows.")
 
         # # Safety: stop if no progress is being made
@@ -107,8 +165,32 @@ def fill_missing_coordinates(csv_path, address_col, max_loops=10):
         #     print("\nStopping because no new coordinates were resolved this round.")
         #     print("Some addresses may simply be ungeocodable.")
         #     return
+    else:
+        print(f"\nStopped after max_loops={max_loops}. Some rows may still be missing.")
+
+    write_csv_atomic(df, csv_path)
+    journal.remove()
+
 
-    print(f"\nStopped after max_loops={max_loops}. Some rows may still be missing.")
+def _full_address(row, address_col, city_state_col, zip_col):
+    street = str(row[address_col]).strip()
+    city_state = str(row[city_state_col]).strip()
+
+    zip_val = ""
+    if zip_col in row.index:
+        raw_zip = row[zip_col]
+        if pd.notna(raw_zip):
+            # Handle float ZIPs like 60002.0 → "60002"
+            try:
+                zip_val = str(int(raw_zip))
+            except Exception:
+                zip_val = str(raw_zip).strip()
+
+    # Build full address: "street, city_state [ZIP]"
+    parts = [street, city_state]
+    if zip_val:
+        parts.append(zip_val)
+    return ", ".join(parts)
 
 
 def fill_missing_coordinates_with_full_address(
@@ -119,58 +201,26 @@ def fill_missing_coordinates_with_full_address(
     max_loops=3
 ):
     csv_path = Path(csv_path)
+    df = pd.read_csv(csv_path)
+    journal = GeocodeJournal(journal_path(csv_path))
 
     for loop in range(1, max_loops + 1):
-        df = pd.read_csv(csv_path)
-
-        # Treat NaN, empty string, and "Not found" as missing
-        lat_str = df["latitude"].astype(str).str.strip().str.lower()
-        lon_str = df["longitude"].astype(str).str.strip().str.lower()
-
-        missing_mask = (
-            df["latitude"].isna()
-            | df["longitude"].isna()
-            | lat_str.isin(["", "nan", "not found"])
-            | lon_str.isin(["", "nan", "not found"])
-        )
+        missing_mask = _missing_coordinates(df)
         missing_count = missing_mask.sum()
 
         if missing_count == 0:
             print(f"\nNo missing coordinates left. All done after {loop-1} loops!")
-            return
+            break
 
         print(f"\nFull-address loop {loop}: {missing_count} rows still missing coords...")
 
-        fixed_this_round = 0
-
-        for idx in tqdm(df[missing_mask].index, total=missing_count):
-            street = str(df.at[idx, address_col]).strip()
-            city_state = str(df.at[idx, city_state_col]).strip()
-
-            zip_val = ""
-            if zip_col in df.columns:
-                raw_zip = df.at[idx, zip_col]
-                if pd.notna(raw_zip):
-                    # Handle float ZIPs like 60002.0 → "60002"
-                    try:
-                        zip_val = str(int(raw_zip))
-                    except Exception:
-                        zip_val = str(raw_zip).strip()
-
-            # Build full address: "street, city_state [ZIP]"
-            parts = [street, city_state]
-            if zip_val:
-                parts.append(zip_val)
-            full_addr = ", ".join(parts)
-
-            result = extract_lat_long(full_addr)
-
-            if isinstance(result, list):
-                df.at[idx, "latitude"] = result[0]
-                df.at[idx, "longitude"] = result[1]
-                fixed_this_round += 1
-
-        df.to_csv(csv_path, index=False)
+        full_addresses = df[missing_mask].apply(
+            _full_address, axis=1, args=(address_col, city_state_col, zip_col)
+        )
+        metrics = ProviderMetrics(provider_name(geolocator))
+        answers = geocode_rows(full_addresses, geolocator, journal, metrics=metrics, rate=1.0)
+        fixed_this_round = _apply_answers(df, answers)
+        print_metrics(metrics)
         print(f" → Full-address loop {loop} fixed {fixed_this_round} rows.")
 
         # # Safety: stop if we didn't fix anything this round
@@ -178,8 +228,11 @@ def fill_missing_coordinates_with_full_address(
         #     print("\nStopping: no new coordinates resolved using full addresses.")
         #     print("Remaining rows are probably not geocodable with Nominatim.")
         #     return
+    else:
+        print(f"\nStopped after max_loops={max_loops}. Some rows may still be missing.")
 
-    print(f"\nStopped after max_loops={max_loops}. Some rows may still be missing.")
+    write_csv_atomic(df, csv_path)
+    journal.remove()
 
 
 # -----------------------------
@@ -188,15 +241,7 @@ def fill_missing_coordinates_with_full_address(
 def export_missing_for_manual(csv_path, output_path):
     df = pd.read_csv(csv_path)
 
-    lat_str = df["latitude"].astype(str).str.strip().str.lower()
-    lon_str = df["longitude"].astype(str).str.strip().str.lower()
-
-    missing = (
-        df["latitude"].isna()
-        | df["longitude"].isna()
-        | lat_str.isin(["", "not found", "nan"])
-        | lon_str.isin(["", "not found", "nan"])
-    )
+    missing = _missing_coordinates(df)
 
     missing_df = df[missing].copy()
     missing_df.to_csv(output_path, index=False)
@@ -242,14 +287,8 @@ if __name__ == "__main__":
     OUTPUT = DATA_DIR / "MHVillage_IL_Parks_coordinated.csv"
     MANUAL_FILE = DATA_DIR / "MHVillage_manual_fix.csv"
 
-    # 1) First pass
-    # get_coordinates(INPUT, OUTPUT, "Address")
-
-    # # 2) Retry missing (same address)
-    # fill_missing_coordinates(OUTPUT, "Address", max_loops=3)
-
-    # # 3) Retry missing (full address)
-    # fill_missing_coordinates_with_full_address(OUTPUT, "Address", "City State", "ZIP", max_loops=3)
+    # 1-3) One pass: raw, no punctuation, full address, ZIP centroid
+    # geocode_with_cascade(INPUT, OUTPUT, "Address", "City State", "ZIP")
 
     # 4) Export remaining missing for manual correction
     # export_missing_for_manual(OUTPUT, MANUAL_FILE)
@@ -0,0 +1,95 @@
+# clustering.py
+# Server-side point clustering in the style of supercluster: the points are
+# grouped once on a grid per zoom level, each level built from the one below
+# it, so a map only ever receives the clusters for its zoom and bounds.
+import math
+
+import numpy as np
+
+# Cluster radius in screen pixels, and the pixel size of a map tile.
+RADIUS = 60
+EXTENT = 256
+
+
+def _mercator_x(lon):
+    return lon / 360.0 + 0.5
+
+
+def _mercator_y(lat):
+    sin = np.sin(np.radians(np.clip(lat, -85.0511, 85.0511)))
+    return 0.5 - 0.25 * np.log((1 + sin) / (1 - sin)) / math.pi
+
+
+def _lon(x):
+    return (x - 0.5) * 360.0
+
+
+def _lat(y):
+    return np.degrees(2 * np.arctan(np.exp((0.5 - y) * 2 * math.pi)) - math.pi / 2)
+
+
+class ClusterIndex:
+    """Hierarchical grid clusters of weighted points, one level per zoom.
+
+    Each level keeps, per cluster, the count-weighted centroid, the number of
+    points, the summed weight (e.g. site counts) and, for single points, the
+    position of the point in the input.
+    """
+
+    def __init__(self, lon, lat, weight=None, min_zoom=0, max_zoom=16, radius=RADIUS):
+        lon = np.asarray(lon, dtype="float64")
+        lat = np.asarray(lat, dtype="float64")
+        weight = np.ones(len(lon)) if weight is None else np.nan_to_num(np.asarray(weight, dtype="float64"))
+
+        self.min_zoom = min_zoom
+        self.max_zoom = max_zoom
+        level = {
+            "x": _mercator_x(lon),
+            "y": _mercator_y(lat),
+            "count": np.ones(len(lon)),
+            "weight": weight,
+            "point": np.arange(len(lon)),
+        }
+        # Above max_zoom every point is shown on its own.
+        self._levels = {max_zoom + 1: level}
+        for z in range(max_zoom, min_zoom - 1, -1):
+            level = self._cluster(level, radius / (EXTENT * 2**z))
+            self._levels[z] = level
+
+    @staticmethod
+    def _cluster(level, cell):
+        cx = np.floor(level["x"] / cell).astype("int64")
+        cy = np.floor(level["y"] / cell).astype("int64")
+        _, inverse = np.unique(cx * (int(1 / cell) + 2) + cy, return_inverse=True)
+
+        count = np.bincount(inverse, level["count"])
+        point = np.empty(len(count), dtype="int64")
+        point[inverse] = level["point"]  # only meaningful where count == 1
+        return {
+            "x": np.bincount(inverse, level["x"] * level["count"]) / count,
+            "y": np.bincount(inverse, level["y"] * level["count"]) / count,
+            "count": count,
+            "weight": np.bincount(inverse, level["weight"]),
+            "point": point,
+        }
+
+    def clusters(self, bounds, zoom):
+        """Clusters inside `bounds` ((south, west), (north, east)) at `zoom`, as
+        a list of dicts with lon, lat, count, weight and, for a single point,
+        its input position under "point" (None for a cluster)."""
+        z = int(min(max(math.floor(zoom), self.min_zoom), self.max_zoom + 1))
+        level = self._levels[z]
+        (south, west), (north, east) = bounds
+
+        mask = (
+            (level["x"] >= _mercator_x(west))
+            & (level["x"] <= _mercator_x(east))
+            & (level["y"] >= _mercator_y(north))
+            & (level["y"] <= _mercator_y(south))
+        )
+        x, y = level["x"][mask], level["y"][mask]
+        count, weight, point = level["count"][mask], level["weight"][mask], level["point"][mask]
+        return [
+            {"lon": lo, "lat": la, "count": int(c), "weight": w, "point": int(p) if c == 1 else None}
+            for lo, la, c, w, p in zip(_lon(x).tolist(), _lat(y).tolist(), count, weight.tolist(), point)
+        ]
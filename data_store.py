@@ -1,29 +1,335 @@
 # data_store.py
-from pathlib import Path
+import hashlib
+import json
+import os
 import pathlib
+import sys
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache, partial
 import pandas as pd
 
+import schemas
+
 here = pathlib.Path(__file__).parent
 
-mhvillage_df = pd.read_csv(here / "dataMI/MHVillageDec7_Legislative1.csv")
-mhvillage_df["Sites"] = pd.to_numeric(mhvillage_df["Sites"], downcast="integer")
+# Cleaned copies of the CSVs below, written by `python data_store.py`.
+snapshot_dir = here / "snapshots"
+
+# Bump when a cleaning step changes so that old snapshots are rebuilt.
+SNAPSHOT_VERSION = 2
+
+
+# name -> (source csv, schema applied before the snapshot is written)
+TABLES = {
+    "mhvillage": (here / "dataMI/MHVillageDec7_Legislative1.csv", schemas.MHVILLAGE_MI),
+    "lara": (here / "dataMI/LARA_with_coord_and_legislativedistrict1.csv", schemas.LARA),
+    "mhvillage_basic": (here / "dataMI/mhvillage_base.csv", schemas.MHVILLAGE_MI),
+    "lara_basic": (here / "dataMI/lara_base.csv", schemas.LARA),
+    "mhvillage_il": (here / "dataIL/LEGIS_LATLONG_MHVillage_IL_Parks.csv", schemas.MHVILLAGE_IL),
+}
+
+
+# ---- Snapshot cache ----
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _snapshot_paths(name):
+    return snapshot_dir / f"{name}.parquet", snapshot_dir / f"{name}.json"
+
+
+def _snapshot_is_fresh(name):
+    """A snapshot is fresh when it is newer than its CSV, or when the CSV's
+    content hash still matches the one recorded at build time (e.g. after a
+    git checkout touched the CSV's mtime)."""
+    csv_path, _ = TABLES[name]
+    snap_path, meta_path = _snapshot_paths(name)
+    if not snap_path.exists() or not meta_path.exists():
+        return False
+
+    with open(meta_path, "r") as f:
+        meta = json.load(f)
+    if meta.get("version") != SNAPSHOT_VERSION:
+        return False
+
+    if snap_path.stat().st_mtime >= csv_path.stat().st_mtime:
+        return True
+    return meta.get("sha256") == _file_hash(csv_path)
+
+
+def _read_csv(name):
+    csv_path, schema = TABLES[name]
+    return schemas.apply_schema(pd.read_csv(csv_path), schema)
+
+
+def _write_snapshot(name, df):
+    """Write `df` and its metadata atomically so that concurrent workers never
+    see a half-written snapshot."""
+    csv_path, _ = TABLES[name]
+    snap_path, meta_path = _snapshot_paths(name)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
 
-lara_df = pd.read_csv(here / "dataMI/LARA_with_coord_and_legislativedistrict1.csv")
-lara_df["County"] = lara_df["County"].str.title()
+    suffix = f".{os.getpid()}.tmp"
+    tmp_snap = snap_path.with_name(snap_path.name + suffix)
+    tmp_meta = meta_path.with_name(meta_path.name + suffix)
 
-mhvillage_basic = pd.read_csv(here / "dataMI/mhvillage_base.csv")
-mhvillage_basic["Sites"] = pd.to_numeric(mhvillage_basic["Sites"], downcast="integer")
+    df.to_parquet(tmp_snap, index=False)
+    with open(tmp_meta, "w") as f:
+        json.dump(
+            {
+                "version": SNAPSHOT_VERSION,
+                "source": csv_path.name,
+                "sha256": _file_hash(csv_path),
+            },
+            f,
+        )
+    os.replace(tmp_meta, meta_path)
+    os.replace(tmp_snap, snap_path)
+
+
+@lru_cache(maxsize=None)
+def data_version():
+    """Short content hash of every source table and the snapshot version, used
+    to key anything derived from the tables."""
+    digest = hashlib.sha256(str(SNAPSHOT_VERSION).encode())
+    for name, (csv_path, _) in sorted(TABLES.items()):
+        digest.update(f"{name}:{_file_hash(csv_path)}".encode())
+    return digest.hexdigest()[:12]
+
+
+def build_snapshots(names=None):
+    """Re-read the CSVs and (re)write every snapshot. Returns the written paths."""
+    written = []
+    for name in names or TABLES:
+        _write_snapshot(name, _read_csv(name))
+        written.append(_snapshot_paths(name)[0])
+    return written
+
+
+def load_table(name):
+    """Load a cleaned table from its snapshot, falling back to the CSV when the
+    snapshot is missing, stale or unreadable. The fallback refreshes the
+    snapshot on a best-effort basis."""
+    snap_path, _ = _snapshot_paths(name)
+    try:
+        if _snapshot_is_fresh(name):
+            return pd.read_parquet(snap_path)
+    except (ImportError, OSError, ValueError):
+        pass
+
+    df = _read_csv(name)
+    try:
+        _write_snapshot(name, df)
+    except (ImportError, OSError, ValueError):
+        pass
+    return df
 
-lara_basic = pd.read_csv(here / "dataMI/lara_base.csv")
-lara_basic["County"] = lara_basic["County"].str.title()
 
 house_districts_geojson_path = here / "dataMI/Michigan_State_House_Districts_2021.json"
 senate_districts_geojson_path = here / "dataMI/Michigan_State_Senate_Districts_2021.json"
 
-# shared lists used by the map builder
-circlelist_lara: list = []
-circlelist_mh: list = []
-mklist_mh: list = []
-mklist_lara: list = []
-upper_layers: list = []
-lower_layers: list = []
\ No newline at end of file
+
+# Simplified copies of the district boundaries written by simplify_districts.py,
+# coarsest first. The map serves a level up to its `max_zoom` and the
+# full-resolution file above that.
+simplified_dir = here / "dataMI/simplified"
+DISTRICT_LEVELS = {
+    "low": {"max_zoom": 7, "tolerance": 0.01, "decimals": 3},
+    "medium": {"max_zoom": 9, "tolerance": 0.0025, "decimals": 4},
+    "high": {"max_zoom": 11, "tolerance": 0.0006, "decimals": 5},
+}
+
+
+def district_level(zoom):
+    """Lightest simplified level that still looks right at `zoom`, or None for
+    the full-resolution boundaries."""
+    for level, spec in DISTRICT_LEVELS.items():
+        if zoom <= spec["max_zoom"]:
+            return level
+    return None
+
+
+def district_geojson(chamber, zoom):
+    """`chamber` ("house" or "senate") boundaries at the detail level for `zoom`."""
+    level = district_level(zoom)
+    if level is None:
+        return get(f"{chamber}_geojson")
+    return get(f"{chamber}_geojson_{level}")
+
+
+def _read_json(path):
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _read_simplified(path, full_path):
+    if path.exists():
+        return _read_json(path)
+    return _read_json(full_path)
+
+
+# ---- Dataset registry ----
+# Every dataset is loaded on first `get()` and kept for the life of the process.
+_loaders = {name: partial(load_table, name) for name in TABLES}
+_loaders["house_geojson"] = partial(_read_json, house_districts_geojson_path)
+_loaders["senate_geojson"] = partial(_read_json, senate_districts_geojson_path)
+for _chamber, _full_path in (
+    ("house", house_districts_geojson_path),
+    ("senate", senate_districts_geojson_path),
+):
+    for _level in DISTRICT_LEVELS:
+        _loaders[f"{_chamber}_geojson_{_level}"] = partial(
+            _read_simplified, simplified_dir / f"{_chamber}_{_level}.json", _full_path
+        )
+
+_datasets: dict = {}
+_stats: dict = {}
+_locks = {name: threading.Lock() for name in _loaders}
+
+
+def register(name, loader):
+    """Add a lazily loaded dataset. `loader` takes no arguments."""
+    _loaders[name] = loader
+    _locks.setdefault(name, threading.Lock())
+
+
+def _nbytes(obj):
+    """Approximate resident size of a loaded dataset."""
+    if hasattr(obj, "memory_usage"):
+        return int(obj.memory_usage(deep=True).sum())
+    if hasattr(obj, "nbytes"):
+        return int(obj.nbytes)
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + sum(_nbytes(k) + _nbytes(v) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + sum(_nbytes(v) for v in obj)
+    return sys.getsizeof(obj)
+
+
+def get(name):
+    """Return dataset `name`, loading it on first use."""
+    if name in _datasets:
+        return _datasets[name]
+    if name not in _loaders:
+        raise KeyError(f"Unknown dataset {name!r}; known: {sorted(_loaders)}")
+
+    with _locks[name]:
+        if name not in _datasets:
+            start = time.perf_counter()
+            obj = _loaders[name]()
+            _stats[name] = {
+                "load_seconds": time.perf_counter() - start,
+                "bytes": _nbytes(obj),
+            }
+            _datasets[name] = obj
+    return _datasets[name]
+
+
+def dataset_stats():
+    """Load time and memory of every dataset loaded so far."""
+    return pd.DataFrame.from_dict(_stats, orient="index")
+
+
+# Old module-level names, now resolved lazily through the registry.
+_legacy_names = {
+    "mhvillage_df": "mhvillage",
+    "lara_df": "lara",
+    "mhvillage_basic": "mhvillage_basic",
+    "lara_basic": "lara_basic",
+}
+
+
+def __getattr__(attr):
+    if attr in _legacy_names:
+        return get(_legacy_names[attr])
+    raise AttributeError(f"module {__name__!r} has no attribute {attr!r}")
+
+
+# ---- Layer cache ----
+class LayerCache:
+    """Built map layer payloads (GeoJSON, spatial indexes), shared by every
+    session in the process.
+
+    Entries are keyed by (dataset, layer type, data_version()), so new data
+    never serves a stale layer. Each key is built once: a caller that finds the
+    key being built waits for it instead of building it again. The least
+    recently used entries are dropped beyond `maxsize`.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._building: dict = {}
+
+    def _lookup(self, key):
+        # Caller holds self._lock.
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return True
+        return False
+
+    def get(self, dataset, kind, build):
+        """Return the `kind` layer of `dataset`, calling `build()` on a miss."""
+        key = (dataset, kind, data_version())
+        with self._lock:
+            if self._lookup(key):
+                return self._entries[key]
+            key_lock = self._building.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if self._lookup(key):
+                    return self._entries[key]
+                self.misses += 1
+            try:
+                value = build()
+            except BaseException:
+                with self._lock:
+                    self._building.pop(key, None)
+                raise
+            # Stored before the key stops being "building", in one step, so no
+            # caller can find neither and build it again.
+            with self._lock:
+                self._entries[key] = value
+                self._building.pop(key, None)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+    def clear(self):
+        """Drop every entry and reset the hit and miss counts."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+layer_cache = LayerCache()
+
+
+if __name__ == "__main__":
+    for path in build_snapshots():
+        print(f"Wrote {path}")
+    for name in _loaders:
+        get(name)
+    print(dataset_stats())
+    print(layer_cache.stats())
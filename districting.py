@@ -0,0 +1,209 @@
+"""
+Assigns legislative districts to communities from their coordinates.
+
+Each boundary file is read once per process and indexed with an STRtree, and
+a whole frame of points is matched against it in one vectorized query:
+    1) A point gets the district whose polygon strictly contains it. A point
+       exactly on a boundary, or outside every polygon, gets none
+    2) If a point falls in more than one polygon (overlapping boundaries), the
+       first polygon in file order wins
+    3) As in the original add_district scripts, both district columns are 0
+       unless the point was found in a House and a Senate district
+
+Use it from Python:
+    from districting import MICHIGAN, add_districts
+    df = add_districts(df, MICHIGAN)
+or from the command line:
+    python districting.py dataMI/LARA_with_all_coord.csv out.csv
+    python districting.py dataIL/LATLONG_MHVillage_IL_Parks.csv out.csv --state IL
+"""
+
+# -----------------------------
+# Imports
+# -----------------------------
+import argparse
+import math
+import time
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+from data_store import here, house_districts_geojson_path, senate_districts_geojson_path
+
+# output column -> (boundary file, district id property)
+MICHIGAN = {
+    "House district": (house_districts_geojson_path, "LABEL"),
+    "Senate district": (senate_districts_geojson_path, "LABEL"),
+}
+ILLINOIS = {
+    "House district": (here / "dataIL/House Plan.shp", "ID"),
+    "Senate district": (here / "dataIL/Senate Plan.shp", "ID"),
+}
+STATES = {"MI": MICHIGAN, "IL": ILLINOIS}
+
+
+# -----------------------------
+# Boundaries
+# -----------------------------
+@lru_cache(maxsize=None)
+def load_boundaries(path, id_column):
+    """Polygons and district ids of one boundary file, with a spatial index."""
+    gdf = gpd.read_file(path)
+    if gdf.crs is not None and not gdf.crs.is_geographic:
+        gdf = gdf.to_crs(4326)
+    geoms = gdf.geometry.values
+    # Prepared once here, so every later point test reuses them.
+    shapely.prepare(geoms)
+    return geoms, gdf[id_column].to_numpy(dtype=object), shapely.STRtree(geoms)
+
+
+# -----------------------------
+# Assignment
+# -----------------------------
+def _first_match(point_idx, polygon_idx):
+    """One (point, polygon) pair per matched point: the lowest polygon index,
+    i.e. the first match in file order."""
+    order = np.lexsort((polygon_idx, point_idx))
+    point_idx, polygon_idx = point_idx[order], polygon_idx[order]
+    first = np.unique(point_idx, return_index=True)[1]
+    return point_idx[first], polygon_idx[first]
+
+
+def find_districts(lon, lat, path, id_column):
+    """District id of every point (None where there is none), in input order."""
+    geoms, ids, tree = load_boundaries(str(path), id_column)
+    points = shapely.points(np.asarray(lon, dtype="float64"), np.asarray(lat, dtype="float64"))
+    point_idx, polygon_idx = _first_match(*tree.query(points, predicate="within"))
+
+    result = np.full(len(points), None, dtype=object)
+    result[point_idx] = ids[polygon_idx]
+    return result
+
+
+def district_at(lat, lon, boundaries=MICHIGAN):
+    """{column: district number or None} for one point, e.g. a searched address."""
+    found = {}
+    for column, (path, id_column) in boundaries.items():
+        district = find_districts([lon], [lat], path, id_column)[0]
+        found[column] = None if district is None else int(district)
+    return found
+
+
+def add_districts(df, boundaries=MICHIGAN, lon="longitude", lat="latitude"):
+    """Copy of `df` with a column per entry of `boundaries` holding the district
+    number, or 0 unless every district of the point was found."""
+    lon = pd.to_numeric(df[lon], errors="coerce")
+    lat = pd.to_numeric(df[lat], errors="coerce")
+    found = {
+        column: pd.Series(find_districts(lon, lat, path, id_column), index=df.index)
+        for column, (path, id_column) in boundaries.items()
+    }
+    in_all = np.logical_and.reduce([ids.notna() for ids in found.values()])
+
+    out = df.copy()
+    for column, ids in found.items():
+        out[column] = pd.to_numeric(ids.where(in_all, 0)).astype("float64")
+    return out
+
+
+# -----------------------------
+# Raster lookup
+# -----------------------------
+OUTSIDE = -1
+ON_BOUNDARY = -2
+
+
+class DistrictGrid:
+    """Precomputed lookup raster over one boundary file.
+
+    Each `cell`-degree grid cell holds the position of the polygon that covers
+    all of it, OUTSIDE where no polygon does, or ON_BOUNDARY where a district
+    edge passes through it. A point is resolved from its cell alone, and only
+    the points in ON_BOUNDARY cells go through the exact polygon test, so the
+    answers are those of find_districts.
+    """
+
+    def __init__(self, path, id_column, cell=0.01):
+        self.path, self.id_column, self.cell = str(path), id_column, cell
+        geoms, self.ids, tree = load_boundaries(self.path, id_column)
+        x0, y0, x1, y1 = shapely.total_bounds(geoms)
+        self.x0, self.y0 = x0 - cell, y0 - cell
+        nx = math.ceil((x1 - self.x0) / cell) + 1
+        ny = math.ceil((y1 - self.y0) / cell) + 1
+
+        # Away from the edges a whole cell shares the district of its center.
+        cx = self.x0 + (np.arange(nx) + 0.5) * cell
+        cy = self.y0 + (np.arange(ny) + 0.5) * cell
+        lon, lat = np.meshgrid(cx, cy)
+        centers = shapely.points(lon.ravel(), lat.ravel())
+        point_idx, polygon_idx = _first_match(*tree.query(centers, predicate="within"))
+        grid = np.full(nx * ny, OUTSIDE, dtype="int32")
+        grid[point_idx] = polygon_idx
+        grid = grid.reshape(ny, nx)
+
+        # Every cell an edge passes through: the edges are densified to half a
+        # cell, and the cells holding a vertex are grown by one cell on each
+        # side to catch edges that only clip a corner.
+        edges = shapely.segmentize(shapely.boundary(geoms), cell / 2)
+        xy = shapely.get_coordinates(edges)
+        ix, iy = self._cell(xy[:, 0], xy[:, 1])
+        edge = np.zeros((ny, nx), dtype=bool)
+        edge[iy, ix] = True
+        grown = edge.copy()
+        grown[1:, :] |= edge[:-1, :]
+        grown[:-1, :] |= edge[1:, :]
+        edge = grown.copy()
+        grown[:, 1:] |= edge[:, :-1]
+        grown[:, :-1] |= edge[:, 1:]
+        grid[grown] = ON_BOUNDARY
+        self.grid = grid
+
+    def _cell(self, lon, lat):
+        ix = np.floor((np.asarray(lon, dtype="float64") - self.x0) / self.cell)
+        iy = np.floor((np.asarray(lat, dtype="float64") - self.y0) / self.cell)
+        return ix.astype("int64"), iy.astype("int64")
+
+    def find_districts(self, lon, lat):
+        """District id of every point (None where there is none), in input order."""
+        lon = np.asarray(lon, dtype="float64")
+        lat = np.asarray(lat, dtype="float64")
+        ny, nx = self.grid.shape
+        valid = np.isfinite(lon) & np.isfinite(lat)
+        ix, iy = self._cell(np.where(valid, lon, self.x0 - 1), np.where(valid, lat, self.y0 - 1))
+        inside = valid & (ix >= 0) & (ix < nx) & (iy >= 0) & (iy < ny)
+
+        codes = np.full(len(lon), OUTSIDE, dtype="int32")
+        codes[inside] = self.grid[iy[inside], ix[inside]]
+
+        result = np.full(len(lon), None, dtype=object)
+        covered = codes >= 0
+        result[covered] = self.ids[codes[covered]]
+        exact = codes == ON_BOUNDARY
+        if exact.any():
+            result[exact] = find_districts(lon[exact], lat[exact], self.path, self.id_column)
+        return result
+
+
+# -----------------------------
+# Driver Script
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("source", help="CSV with longitude and latitude columns")
+    parser.add_argument("out", help="CSV to write, with House and Senate district columns added")
+    parser.add_argument("--state", choices=sorted(STATES), default="MI")
+    parser.add_argument("--lon", default="longitude", help="longitude column (default: longitude)")
+    parser.add_argument("--lat", default="latitude", help="latitude column (default: latitude)")
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.source)
+    start = time.perf_counter()
+    df = add_districts(df, STATES[args.state], lon=args.lon, lat=args.lat)
+    seconds = time.perf_counter() - start
+
+    df.to_csv(args.out, index=False)
+    assigned = (df["House district"] != 0).sum()
+    print(f"Assigned districts to {assigned} of {len(df)} rows in {seconds:.2f}s; wrote {args.out}")
@@ -0,0 +1,507 @@
+"""
+Geocodes many addresses concurrently while staying within a provider's rate
+limit.
+
+    1) Addresses the cache (geocoding.CachedGeocoder) or a local index
+       (offline_geocoder.OfflineGeocoder) can answer are resolved up front and
+       never wait for the rate limiter
+    2) The rest run as concurrent requests, each one waiting for a token from a
+       token bucket refilled at `rate` requests per second
+    3) Timeouts, rate limiting and server errors are retried with exponential
+       backoff; other errors (bad API key, bad query) are not
+    4) Results come back in input order, with per-provider metrics
+
+geocode_cascade runs a frame through an ordered list of ways to write each
+address (as given, without punctuation, street + city/state + ZIP, ZIP code
+only) and stops at the first one that resolves the row.
+
+Providers are geopy geocoders: Nominatim, GoogleV3, or "mock", a Nominatim
+stand-in served from this machine (MockNominatim) for tests and dry runs.
+
+Run a dry run against the mock server:
+    python geocode_pipeline.py --mock 200
+or geocode a column of a CSV:
+    python geocode_pipeline.py dataIL/MHVillage_IL_Parks.csv Address out.csv --rate 1
+"""
+
+# -----------------------------
+# Imports
+# -----------------------------
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+from geopy.exc import (
+    GeocoderRateLimited,
+    GeocoderServiceError,
+    GeocoderTimedOut,
+    GeocoderUnavailable,
+)
+from geopy.geocoders import GoogleV3, Nominatim
+
+from addresses import address_groups, normalize_addresses, normalize_zips
+from geocoding import USER_AGENT, CachedGeocoder
+
+# Worth another try: the request may succeed later. A plain
+# GeocoderServiceError is what geopy raises for a 5xx answer.
+RETRYABLE = (GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited)
+
+
+# -----------------------------
+# Providers
+# -----------------------------
+def make_provider(name, api_key=None, domain=None):
+    """A geopy geocoder by name: "nominatim", "googlev3" or "mock" (which needs
+    `domain`, e.g. MockNominatim().domain)."""
+    if name == "nominatim":
+        return Nominatim(user_agent=USER_AGENT)
+    if name == "googlev3":
+        return GoogleV3(api_key=api_key)
+    if name == "mock":
+        return Nominatim(user_agent=USER_AGENT, domain=domain, scheme="http")
+    raise KeyError(f"Unknown geocoding provider {name!r}")
+
+
+def provider_name(geocoder):
+    return getattr(geocoder, "provider", None) or type(geocoder).__name__
+
+
+class MockNominatim:
+    """Local HTTP server answering Nominatim /search requests from a
+    {address: (latitude, longitude)} dict, with optional latency and a share
+    of requests failing with 503. Use as a context manager."""
+
+    def __init__(self, locations=None, latency=0.0, failure_rate=0.0, seed=0):
+        self.locations = {_normalize(k): v for k, v in (locations or {}).items()}
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def domain(self):
+        host, port = self._server.server_address
+        return f"{host}:{port}"
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query).get("q", [""])[0]
+                with mock._lock:
+                    mock.requests += 1
+                    fail = mock._random.random() < mock.failure_rate
+                time.sleep(mock.latency)
+                if fail:
+                    self.send_response(503)
+                    self.end_headers()
+                    return
+                point = mock.locations.get(_normalize(query))
+                body = [] if point is None else [
+                    {"lat": str(point[0]), "lon": str(point[1]), "display_name": query}
+                ]
+                payload = json.dumps(body).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _normalize(address):
+    return " ".join(str(address).lower().split())
+
+
+# -----------------------------
+# Rate limiting and metrics
+# -----------------------------
+class TokenBucket:
+    """At most `rate` acquisitions per second on average, and at most `burst`
+    at once."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ProviderMetrics:
+    """Request counts and timing of one provider over one run."""
+
+    def __init__(self, provider):
+        self.provider = provider
+        self.addresses = 0
+        self.unique = 0
+        self.cached = 0
+        self.requests = 0
+        self.found = 0
+        self.not_found = 0
+        self.retries = 0
+        self.errors = 0
+        self.failed = 0
+        self.request_seconds = 0.0
+        self.wall_seconds = 0.0
+
+    def as_dict(self):
+        return {
+            "provider": self.provider,
+            "addresses": self.addresses,
+            "unique": self.unique,
+            "cached": self.cached,
+            "requests": self.requests,
+            "found": self.found,
+            "not_found": self.not_found,
+            "retries": self.retries,
+            "errors": self.errors,
+            "failed": self.failed,
+            "requests_per_s": round(self.requests / self.wall_seconds, 2) if self.wall_seconds else 0.0,
+            "mean_latency_s": round(self.request_seconds / self.requests, 3) if self.requests else 0.0,
+        }
+
+
+# -----------------------------
+# Pipeline
+# -----------------------------
+async def geocode_all(
+    addresses,
+    geocoder,
+    rate=1.0,
+    burst=1,
+    concurrency=4,
+    retries=3,
+    backoff=1.0,
+    metrics=None,
+    on_result=None,
+):
+    """(locations, metrics): a Location (or None) for every address, in input
+    order. An address that still fails after `retries` retries is None and
+    counted in metrics.failed. `on_result(i, location, failed)` is called as
+    soon as address i is resolved."""
+    metrics = metrics or ProviderMetrics(provider_name(geocoder))
+    metrics.addresses += len(addresses)
+    metrics.unique += len(addresses)
+    bucket = TokenBucket(rate, burst)
+    slots = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+
+    async def resolve(address):
+        if pd.isna(address) or not str(address).strip():
+            return None, False
+        if hasattr(geocoder, "lookup"):
+            cached, location = geocoder.lookup(address)
+            if cached:
+                metrics.cached += 1
+                return location, False
+
+        async with slots:
+            for attempt in range(retries + 1):
+                await bucket.acquire()
+                metrics.requests += 1
+                sent = time.perf_counter()
+                try:
+                    location = await asyncio.to_thread(geocoder.geocode, address)
+                except GeocoderServiceError as error:
+                    metrics.errors += 1
+                    metrics.request_seconds += time.perf_counter() - sent
+                    if attempt == retries or not _retryable(error):
+                        metrics.failed += 1
+                        return None, True
+                    metrics.retries += 1
+                    delay = getattr(error, "retry_after", None) or backoff * 2**attempt
+                    await asyncio.sleep(delay)
+                    continue
+                metrics.request_seconds += time.perf_counter() - sent
+                if location is None:
+                    metrics.not_found += 1
+                else:
+                    metrics.found += 1
+                return location, False
+
+    async def one(i, address):
+        location, failed = await resolve(address)
+        if on_result is not None:
+            on_result(i, location, failed)
+        return location
+
+    results = await asyncio.gather(*(one(i, address) for i, address in enumerate(addresses)))
+    metrics.wall_seconds += time.perf_counter() - start
+    return results, metrics
+
+
+def _retryable(error):
+    # geopy raises the base class for 5xx answers, and subclasses for errors
+    # that won't go away on their own (bad key, bad query, quota).
+    return isinstance(error, RETRYABLE) or type(error) is GeocoderServiceError
+
+
+def geocode_many(addresses, geocoder, **options):
+    """Blocking wrapper around geocode_all for scripts."""
+    return asyncio.run(geocode_all(list(addresses), geocoder, **options))
+
+
+# -----------------------------
+# Journaled runs
+# -----------------------------
+class GeocodeJournal:
+    """Append-only record of a geocoding run: one JSON line per (row, query)
+    answered, flushed as soon as the answer arrives. A run that is stopped
+    part way reopens the same journal and skips every pair it already answered;
+    only failed requests are tried again."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def _load(self):
+        text = self.path.read_text(encoding="utf-8")
+        complete = text[: text.rfind("\n") + 1]
+        if len(complete) < len(text):
+            # The last line was cut off mid-write; drop it.
+            with open(self.path, "r+", encoding="utf-8") as f:
+                f.truncate(len(complete.encode("utf-8")))
+        for line in complete.splitlines():
+            entry = json.loads(line)
+            self.entries[(entry["row"], entry["query"])] = entry
+
+    def answer(self, row, query):
+        """The journaled answer, or None if the pair still needs a request."""
+        entry = self.entries.get((_row_key(row), query))
+        if entry is None or entry["status"] == "failed":
+            return None
+        return entry
+
+    def record(self, row, query, location, failed=False):
+        entry = {
+            "row": _row_key(row),
+            "query": query,
+            "status": "failed" if failed else ("found" if location else "not_found"),
+            "latitude": location.latitude if location else None,
+            "longitude": location.longitude if location else None,
+            "address": location.address if location else None,
+        }
+        self.entries[(entry["row"], query)] = entry
+        self._file.write(json.dumps(entry) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        self._file.close()
+
+    def remove(self):
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+
+def _row_key(row):
+    # JSON turns row labels into plain ints/strings; keep lookups consistent.
+    return row.item() if hasattr(row, "item") else row
+
+
+def journal_path(csv_path):
+    csv_path = Path(csv_path)
+    return csv_path.with_name(csv_path.name + ".journal.jsonl")
+
+
+def geocode_rows(queries, geocoder, journal, metrics=None, **options):
+    """{row: (latitude, longitude) or None} for `queries`, a Series of
+    addresses indexed by row (rows without an address are left out).
+
+    Rows whose addresses have the same canonical form (addresses.py) share one
+    request, and the answer is fanned out to all of them. Pairs the journal
+    already answered cost no request; every new answer is journaled as it
+    arrives. Pass `metrics` (a ProviderMetrics) to get the address, unique
+    address and request counts."""
+    metrics = metrics or ProviderMetrics(provider_name(geocoder))
+    queries = queries.dropna()
+    todo = pd.Series(
+        [journal.answer(row, query) is None for row, query in queries.items()], index=queries.index, dtype=bool
+    )
+    pending = queries[todo]
+    groups, _ = address_groups(normalize_addresses(pending))
+    first = pending[~groups.duplicated()]
+    members = {group: rows for group, rows in pending.groupby(groups.to_numpy()).groups.items()}
+
+    def record(i, location, failed):
+        for row in members[groups[first.index[i]]]:
+            journal.record(row, pending[row], location, failed)
+
+    # geocode_all counts the unique ones; these are the rows fanned out to.
+    metrics.addresses += len(pending) - len(first)
+    if len(pending):
+        geocode_many(first.tolist(), geocoder, metrics=metrics, on_result=record, **options)
+
+    answers = {}
+    for row, query in queries.items():
+        entry = journal.answer(row, query)
+        found = entry is not None and entry["status"] == "found"
+        answers[row] = (entry["latitude"], entry["longitude"]) if found else None
+    return answers
+
+
+def write_csv_atomic(df, path):
+    """Write `df` to `path` in one step: readers see the old file or the new
+    one, never a partial write."""
+    path = Path(path)
+    tmp = path.with_name(path.name + f".{os.getpid()}.tmp")
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+# -----------------------------
+# Strategy cascade
+# -----------------------------
+def _zip5(df, columns):
+    if not columns.get("zip"):
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+    return normalize_zips(df[columns["zip"]])
+
+
+def _raw(df, columns):
+    return df[columns["address"]].astype("string")
+
+
+def _no_punctuation(df, columns):
+    # As in the MI scripts' "no punc." column.
+    return _raw(df, columns).str.translate(str.maketrans("", "", string.punctuation))
+
+
+def _full_address(df, columns):
+    # "street, city_state[, ZIP]", as fill_missing_coordinates_with_full_address built it.
+    if not columns.get("city_state"):
+        return pd.Series(pd.NA, index=df.index, dtype="string")
+    full = _raw(df, columns).str.strip() + ", " + df[columns["city_state"]].astype("string").str.strip()
+    zips = _zip5(df, columns)
+    return full.where(zips.isna(), full + ", " + zips)
+
+
+def _zip_centroid(df, columns):
+    # Last resort, and only as precise as the ZIP code: see geocode_strategy.
+    return _zip5(df, columns) + ", USA"
+
+
+# name -> query builder, tried in this order
+STRATEGIES = {
+    "raw": _raw,
+    "no_punctuation": _no_punctuation,
+    "full_address": _full_address,
+    "zip_centroid": _zip_centroid,
+}
+
+
+def geocode_cascade(df, geocoder, journal, columns, strategies=tuple(STRATEGIES), metrics=None, **options):
+    """Coordinates for every row of `df` in one pass over the strategies.
+
+    Each strategy only sees the rows no earlier strategy resolved, and a row
+    that every strategy failed on is left unresolved instead of being retried.
+    `columns` maps "address", "city_state" and "zip" to column names (the last
+    two may be None), and `metrics` collects the requests of every strategy.
+    Returns (frame of latitude, longitude and geocode_strategy indexed like
+    df, one stats row per strategy)."""
+    result = pd.DataFrame(
+        {"latitude": float("nan"), "longitude": float("nan"), "geocode_strategy": None}, index=df.index
+    )
+    remaining = df.index
+    stats = []
+    for name in strategies:
+        queries = STRATEGIES[name](df.loc[remaining], columns).dropna()
+        answers = geocode_rows(queries, geocoder, journal, metrics=metrics, **options)
+        found = [row for row, point in answers.items() if point is not None]
+        for row in found:
+            result.loc[row, ["latitude", "longitude"]] = answers[row]
+            result.loc[row, "geocode_strategy"] = name
+        stats.append({"strategy": name, "tried": len(queries), "found": len(found)})
+        remaining = remaining.difference(found)
+
+    stats.append({"strategy": "unresolved", "tried": 0, "found": len(remaining)})
+    return result, pd.DataFrame(stats)
+
+
+def print_metrics(metrics):
+    for key, value in metrics.as_dict().items():
+        print(f"  {key:<16}{value}")
+
+
+# -----------------------------
+# Driver Script
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("source", nargs="?", help="CSV with an address column")
+    parser.add_argument("address_col", nargs="?", help="name of the address column")
+    parser.add_argument("out", nargs="?", help="CSV to write, with latitude and longitude added")
+    parser.add_argument("--provider", choices=["nominatim", "googlev3"], default="nominatim")
+    parser.add_argument("--api-key", help="API key for googlev3")
+    parser.add_argument("--rate", type=float, default=1.0, help="requests per second (Nominatim allows 1)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--mock", type=int, metavar="N", help="dry run: N addresses against a local mock server")
+    args = parser.parse_args()
+
+    if args.mock:
+        addresses = [f"{i} Main St, Springfield, IL" for i in range(args.mock)]
+        known = {address: (40.0 + i * 1e-4, -89.0) for i, address in enumerate(addresses) if i % 10}
+        with MockNominatim(known, latency=0.05, failure_rate=0.1) as server:
+            geocoder = make_provider("mock", domain=server.domain)
+            results, metrics = geocode_many(
+                addresses, geocoder, rate=50, burst=10, concurrency=16, retries=args.retries, backoff=0.05
+            )
+        # Every answer must belong to the address in its position.
+        for address, location in zip(addresses, results):
+            assert location is None or location.latitude == known[address][0], "results out of order"
+        print(f"Mock run, {len(addresses)} addresses ({server.requests} requests served):")
+        print_metrics(metrics)
+    else:
+        if not args.out:
+            parser.error("give source, address_col and out, or --mock N")
+        df = pd.read_csv(args.source)
+        geocoder = CachedGeocoder(make_provider(args.provider, api_key=args.api_key))
+        results, metrics = geocode_many(
+            df[args.address_col], geocoder, rate=args.rate, concurrency=args.concurrency, retries=args.retries
+        )
+        df["latitude"] = [r.latitude if r else None for r in results]
+        df["longitude"] = [r.longitude if r else None for r in results]
+        df.to_csv(args.out, index=False)
+        print(f"Wrote {args.out}")
+        print_metrics(metrics)
@@ -0,0 +1,170 @@
+# geocoding.py
+# Address -> coordinates. The geocoder is pluggable: the app shares one
+# Nominatim client per process, and tests can swap in a StaticGeocoder so no
+# request leaves the machine. Any geocoder can be wrapped in a CachedGeocoder,
+# which keeps its answers on disk across runs.
+import json
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from geopy.geocoders import Nominatim
+from geopy.location import Location
+
+from data_store import here
+
+USER_AGENT = "mhaction_mhc_map"
+
+# Answers of every geocoder run, shared by the address-cleaning scripts.
+GEOCODE_CACHE = here / "geocode_cache.sqlite"
+# "Not found" is remembered this long before the address is tried again.
+NEGATIVE_TTL = 30 * 24 * 3600
+
+_geocoder = None
+
+
+@lru_cache(maxsize=None)
+def nominatim():
+    return Nominatim(user_agent=USER_AGENT)
+
+
+def get_geocoder():
+    return _geocoder or nominatim()
+
+
+def set_geocoder(geocoder):
+    """Use `geocoder` (anything with geopy's geocode(query)) from now on; None
+    restores Nominatim."""
+    global _geocoder
+    _geocoder = geocoder
+
+
+class StaticGeocoder:
+    """Stand-in geocoder answering from a {address: (latitude, longitude)}
+    dict, ignoring case and surrounding whitespace."""
+
+    def __init__(self, locations):
+        self.locations = {_key(address): point for address, point in locations.items()}
+
+    def geocode(self, query, **kwargs):
+        point = self.locations.get(_key(query))
+        if point is None:
+            return None
+        return Location(query, point, {})
+
+
+def _key(address):
+    return " ".join(address.lower().split())
+
+
+def geocode(address, geocoder=None):
+    """(latitude, longitude) of `address`, or (None, None) if it wasn't found."""
+    location = (geocoder or get_geocoder()).geocode(address)
+    if location:
+        return location.latitude, location.longitude
+    return None, None
+
+
+# ---- On-disk cache ----
+class GeocodeCache:
+    """SQLite store of geocoder answers keyed by (provider, normalized address).
+
+    A found address keeps its raw response, coordinates and clean address for
+    good. A "not found" answer expires after `negative_ttl` seconds, so a later
+    run tries it again. Errors (timeouts, rate limits) are never stored.
+    """
+
+    def __init__(self, path=GEOCODE_CACHE, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(path), check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS geocodes (
+                    provider TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    found INTEGER NOT NULL,
+                    address TEXT,
+                    latitude REAL,
+                    longitude REAL,
+                    raw TEXT,
+                    fetched REAL NOT NULL,
+                    PRIMARY KEY (provider, key)
+                )
+                """
+            )
+
+    def get(self, provider, address):
+        """(True, Location or None) for a cached answer, (False, None) otherwise."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT found, address, latitude, longitude, raw, fetched FROM geocodes"
+                " WHERE provider = ? AND key = ?",
+                (provider, _key(address)),
+            ).fetchone()
+        if row is None:
+            return False, None
+        found, clean, lat, lon, raw, fetched = row
+        if not found:
+            return time.time() - fetched < self.negative_ttl, None
+        return True, Location(clean, (lat, lon), json.loads(raw) if raw else {})
+
+    def put(self, provider, address, location):
+        """Store an answer; `location` is None for "not found"."""
+        if location is None:
+            values = (0, None, None, None, None)
+        else:
+            raw = json.dumps(location.raw, default=str)
+            values = (1, location.address, location.latitude, location.longitude, raw)
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO geocodes"
+                " (provider, key, query, found, address, latitude, longitude, raw, fetched)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (provider, _key(address), address, *values, time.time()),
+            )
+
+    def stats(self):
+        with self._lock:
+            found, missing = self._db.execute(
+                "SELECT COALESCE(SUM(found), 0), COALESCE(SUM(1 - found), 0) FROM geocodes"
+            ).fetchone()
+        return {"found": found, "not_found": missing}
+
+
+class CachedGeocoder:
+    """Read-through wrapper: `geocoder` is only asked about addresses the cache
+    has no (unexpired) answer for.
+
+    The cache lives in GEOCODE_CACHE by default, so a rerun of a script, or
+    its retry pass, only asks about addresses not answered yet, and a second
+    lookup of the same address in one run (clean address, then coordinates)
+    costs no request. "Not found" is asked again after NEGATIVE_TTL.
+    """
+
+    def __init__(self, geocoder, cache=None, provider=None):
+        self.geocoder = geocoder
+        self.cache = cache or GeocodeCache()
+        self.provider = provider or type(geocoder).__name__
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query):
+        """(True, answer) if the cache can answer `query`, else (False, None)."""
+        cached, location = self.cache.get(self.provider, query)
+        if cached:
+            self.hits += 1
+        return cached, location
+
+    def geocode(self, query, **kwargs):
+        cached, location = self.lookup(query)
+        if cached:
+            return location
+        self.misses += 1
+        location = self.geocoder.geocode(query, **kwargs)
+        self.cache.put(self.provider, query, location)
+        return location
@@ -12,6 +12,8 @@ import pandas as pd
 ##from regex_add import regex, regex1
 #import geopy
 from geopy.geocoders import Nominatim
+from geocoding import CachedGeocoder
+from addresses import address_groups, address_keys
 
 ####INPUT FOR UPDATING DATA
 
@@ -29,7 +31,7 @@ MHVILLAGE_file_str = "MHVillage_IL_Parks.csv"
 
 # !!!!!!!!!! free but doesn't work as well as google API
 # is very slow
-geolocator = Nominatim(user_agent="kajana@umich.edu")
+geolocator = CachedGeocoder(Nominatim(user_agent="kajana@umich.edu"))
 
 # two functions from medium article: 
 # link:https://towardsdatascience.com/transform-messy-address-into-clean-data-effortlessly-using-geopy-and-python-d3f726461225
@@ -83,8 +85,8 @@ agg_rules = {
     'Name': 'first',
     'City State ZIP': 'first',
     
-    #Get the first non-NaN value
-    'ZIP': lambda x: x.dropna().iloc[0] if not x.dropna().empty else None,
+    #Get the first non-NaN value ('first' skips NaN)
+    'ZIP': 'first',
 
     # Get max
     'Number of Sites': 'max',
@@ -111,9 +113,15 @@ mhvillage_df_copy["FULL Address"] = (mhvillage_df_copy["Address"])+ \
     (mhvillage_df_copy["City State ZIP"]) + ", " + (mhvillage_df_copy["ZIP_str"])
 
 print('Checkpt: pre find latlong')
-mhvillage_df_copy['lat_long'] = mhvillage_df_copy.apply(lambda x: \
-                                                        extract_lat_long(x['FULL Address']) , \
-                                                            axis =1)
+# rows that differ only in case, punctuation or "Rd" vs "Road" share a
+# canonical key: geocode one row per key and copy its answer to the rest
+keys = address_keys(mhvillage_df_copy, 'Address', 'City State ZIP', 'ZIP')
+groups, n_unique = address_groups(keys)
+print(f'{len(mhvillage_df_copy)} addresses, {n_unique} unique')
+first_of_group = mhvillage_df_copy[~groups.duplicated()]
+lat_long_by_group = dict(zip(groups[first_of_group.index],
+                             first_of_group['FULL Address'].map(extract_lat_long)))
+mhvillage_df_copy['lat_long'] = groups.map(lat_long_by_group)
 mhvillage_df_copy['latitude'] = mhvillage_df_copy.apply(lambda x: x['lat_long'][0] \
                                                         if x['lat_long'] != '' else '', axis =1)
 mhvillage_df_copy['longitude'] = mhvillage_df_copy.apply(lambda x: x['lat_long'][1] \
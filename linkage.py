@@ -0,0 +1,269 @@
+# linkage.py
+# Links the LARA licence records to the MHVillage listings of the same
+# community. Candidate pairs come from two blocks, so only a few pairs per
+# community are scored instead of every LARA x MHVillage pair:
+#   - spatial: MHVillage communities within BLOCK_KM of a LARA one (STRtree)
+#   - county: the same county and the same house number, for rows whose
+#     coordinates are missing or were geocoded to the wrong place
+# Each pair is scored field by field (name, street address, distance) with
+# agreement weights, and pairs are linked one-to-one, best score first.
+import argparse
+import difflib
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from addresses import DIRECTIONS, SUFFIXES, normalize_addresses
+from data_store import get
+
+BLOCK_KM = 2.0
+# Pairs scoring at least this are the same community.
+LINK_SCORE = 3.0
+
+KM_PER_DEGREE = 111.32
+
+# Words that say what a community is rather than which one it is.
+GENERIC = (
+    "MOBILE MANUFACTURED HOME HOMES HOUSING PARK COMMUNITY COMMUNITIES MHP MHC MH "
+    "LLC INC CO CORP LTD LP THE OF AND"
+).split()
+_GENERIC = r"\b(?:" + "|".join(GENERIC) + r")\b"
+
+# LARA spells some counties differently from MHVillage.
+COUNTY_ALIASES = {"GENESSEE": "GENESEE"}
+
+ORDINALS = {
+    "FIRST": "1ST",
+    "SECOND": "2ND",
+    "THIRD": "3RD",
+    "FOURTH": "4TH",
+    "FIFTH": "5TH",
+    "SIXTH": "6TH",
+    "SEVENTH": "7TH",
+    "EIGHTH": "8TH",
+    "NINTH": "9TH",
+    "TENTH": "10TH",
+}
+# Street words that LARA and MHVillage often disagree on ("E McDevitt Rd" vs
+# "Mc Devitt"); streets are compared without them.
+_STREET_NOISE = r"\b(?:" + "|".join(sorted(set(SUFFIXES.values()) | set(DIRECTIONS.values()))) + r")\b|\s"
+_ORDINALS = r"\b(" + "|".join(ORDINALS) + r")\b"
+
+
+# ---- Normalization ----
+def _names(names):
+    """Upper-case names without punctuation or generic words; a name made only
+    of generic words ("Village Mobile Home Park") keeps them."""
+    full = normalize_addresses(names)
+    short = full.str.replace(_GENERIC, " ", regex=True).str.replace(r"\s+", " ", regex=True).str.strip()
+    return short.where(short.fillna("") != "", full)
+
+
+def _counties(counties):
+    out = counties.astype("string").str.upper().str.replace(r"[^\w\s]", "", regex=True)
+    out = out.str.replace(r"\bSAINT\b", "ST", regex=True).str.strip()
+    return out.replace(COUNTY_ALIASES)
+
+
+def _streets(addresses):
+    """(house number, street) of the part of each address before the first
+    comma; the street without directions, suffixes or spaces."""
+    street = normalize_addresses(addresses.astype("string").str.split(",", n=1).str[0])
+    parts = street.str.extract(r"^(\d+)[A-Z]?\s+(.+)$")
+    core = parts[1].fillna(street).str.replace(_ORDINALS, lambda m: ORDINALS[m.group(1)], regex=True)
+    core = core.str.replace(_STREET_NOISE, "", regex=True)
+    return parts[0], core.where(core != "", street)
+
+
+def _points_km(df):
+    """Points in kilometres on a plane tangent at Michigan's latitude; (0, 0)
+    coordinates are missing ones, as in map_layers.marker_frame."""
+    lat = pd.to_numeric(df["latitude"], errors="coerce")
+    lon = pd.to_numeric(df["longitude"], errors="coerce")
+    null_island = (lat == 0) & (lon == 0)
+    lat = lat.mask(null_island).to_numpy("float64")
+    lon = lon.mask(null_island).to_numpy("float64")
+    x = lon * KM_PER_DEGREE * np.cos(np.radians(44.0))
+    return shapely.points(x, lat * KM_PER_DEGREE)
+
+
+def _records(df, names, address):
+    number, street = _streets(df[address])
+    return pd.DataFrame(
+        {
+            "names": list(zip(*(_names(df[name]).tolist() for name in names))),
+            "county": _counties(df["County"]).tolist(),
+            "number": number.tolist(),
+            "street": street.tolist(),
+            "point": _points_km(df),
+        }
+    )
+
+
+# ---- Blocking ----
+def candidate_pairs(lara, mhvillage, block_km=BLOCK_KM):
+    """(lara positions, mhvillage positions) of every pair worth scoring."""
+    left, right = lara["point"].to_numpy(), mhvillage["point"].to_numpy()
+    # Rows without coordinates can only be found through the county block.
+    left_at = np.flatnonzero(~np.isnan(shapely.get_x(left)))
+    right_at = np.flatnonzero(~np.isnan(shapely.get_x(right)))
+    tree = shapely.STRtree(right[right_at])
+    i, j = tree.query(left[left_at], predicate="dwithin", distance=block_km)
+    spatial = pd.DataFrame({"lara": left_at[i], "mhvillage": right_at[j]})
+
+    keys = ["county", "number"]
+    by_county = (
+        lara[keys].reset_index(names="lara").dropna()
+        .merge(mhvillage[keys].reset_index(names="mhvillage").dropna(), on=keys)
+    )
+    pairs = pd.concat([spatial, by_county[["lara", "mhvillage"]]]).drop_duplicates()
+    return pairs["lara"].to_numpy(), pairs["mhvillage"].to_numpy()
+
+
+# ---- Scoring ----
+def _ratio(a, b):
+    """difflib ratio of two strings, None if either is missing."""
+    if not isinstance(a, str) or not isinstance(b, str):
+        return None
+    return difflib.SequenceMatcher(None, a, b).ratio()
+
+
+def _name_similarity(a, b):
+    """_ratio of two names, except that every word of the shorter one (of at
+    least two words) being in the longer one counts as 1.0, and sharing a word
+    of four or more letters ("SUN CUTLER" and "CUTLER ESTS") as at least 0.6."""
+    ratio = _ratio(a, b)
+    if ratio is None:
+        return None
+    words_a, words_b = set(a.split()), set(b.split())
+    if min(len(words_a), len(words_b)) >= 2 and (words_a <= words_b or words_b <= words_a):
+        return 1.0
+    if any(len(word) >= 4 for word in words_a & words_b):
+        return max(ratio, 0.6)
+    return ratio
+
+
+def name_weight(similarity):
+    if similarity is None:
+        return 0.0
+    if similarity >= 0.9:
+        return 4.0
+    if similarity >= 0.75:
+        return 2.5
+    if similarity >= 0.6:
+        return 1.0
+    return -1.5
+
+
+def address_weight(same_number, similarity):
+    if similarity is None:
+        return 0.0
+    if same_number:
+        return 4.0 if similarity >= 0.8 else 2.0
+    return 0.5 if similarity >= 0.8 else -1.0
+
+
+def distance_weight(km):
+    if np.isnan(km):
+        return 0.0
+    if km <= 0.5:
+        return 2.0
+    if km <= 1.5:
+        return 1.0
+    if km <= 3.0:
+        return 0.0
+    return -1.0
+
+
+def score_pairs(lara, mhvillage, i, j):
+    """Field similarities, distance and total weight of every (i, j) pair."""
+    left_names, right_names = lara["names"].tolist(), mhvillage["names"].tolist()
+    left_streets, right_streets = lara["street"].tolist(), mhvillage["street"].tolist()
+    left_numbers, right_numbers = lara["number"].tolist(), mhvillage["number"].tolist()
+    rows = []
+    for a, b in zip(i.tolist(), j.tolist()):
+        names = [_name_similarity(name, right_names[b][0]) for name in left_names[a]]
+        name = max((s for s in names if s is not None), default=None)
+        street = _ratio(left_streets[a], right_streets[b])
+        same_number = isinstance(left_numbers[a], str) and left_numbers[a] == right_numbers[b]
+        rows.append((name, street, same_number))
+    pairs = pd.DataFrame(rows, columns=["name_similarity", "address_similarity", "same_number"])
+    pairs.insert(0, "lara", i)
+    pairs.insert(1, "mhvillage", j)
+    pairs["distance_km"] = shapely.distance(lara["point"].to_numpy()[i], mhvillage["point"].to_numpy()[j])
+    pairs["score"] = (
+        pairs["name_similarity"].map(name_weight)
+        + [address_weight(n, s) for n, s in zip(pairs["same_number"], pairs["address_similarity"])]
+        + pairs["distance_km"].map(distance_weight)
+    )
+    return pairs
+
+
+def _one_to_one(pairs, min_score):
+    """The best-scoring pairs such that no record is in two of them."""
+    pairs = pairs[pairs["score"] >= min_score].sort_values(["score", "distance_km"], ascending=[False, True])
+    used_lara, used_mhvillage, keep = set(), set(), []
+    for row, a, b in zip(pairs.index, pairs["lara"], pairs["mhvillage"]):
+        if a not in used_lara and b not in used_mhvillage:
+            used_lara.add(a)
+            used_mhvillage.add(b)
+            keep.append(row)
+    return pairs.loc[keep]
+
+
+# ---- Linked table ----
+def link_communities(lara, mhvillage, block_km=BLOCK_KM, min_score=LINK_SCORE):
+    """One row per community: the positions of its LARA and MHVillage records
+    (<NA> where a source doesn't have it), "both", "LARA only" or "MHVillage
+    only", and for linked rows the pair's similarities, distance and score."""
+    left = _records(lara, ["DBA", "Owner / Community_Name"], "Location_Address")
+    right = _records(mhvillage, ["Name"], "FullstreetAddress")
+    links = _one_to_one(score_pairs(left, right, *candidate_pairs(left, right, block_km)), min_score)
+
+    only_lara = np.setdiff1d(np.arange(len(lara)), links["lara"])
+    only_mhvillage = np.setdiff1d(np.arange(len(mhvillage)), links["mhvillage"])
+    table = pd.concat(
+        [
+            links.drop(columns="same_number").assign(status="both"),
+            pd.DataFrame({"lara": only_lara, "status": "LARA only"}),
+            pd.DataFrame({"mhvillage": only_mhvillage, "status": "MHVillage only"}),
+        ],
+        ignore_index=True,
+    )
+    table[["lara", "mhvillage"]] = table[["lara", "mhvillage"]].astype("Int64")
+
+    def column(df, col, rows):
+        values = pd.Series(pd.NA, index=table.index, dtype="object")
+        found = rows.notna()
+        values[found] = df[col].to_numpy()[rows[found].to_numpy("int64")]
+        return values
+
+    table["County"] = column(lara, "County", table["lara"]).fillna(column(mhvillage, "County", table["mhvillage"]))
+    table["LARA name"] = column(lara, "DBA", table["lara"]).fillna(column(lara, "Owner / Community_Name", table["lara"]))
+    table["MHVillage name"] = column(mhvillage, "Name", table["mhvillage"])
+    table["LARA address"] = column(lara, "Location_Address", table["lara"])
+    table["MHVillage address"] = column(mhvillage, "FullstreetAddress", table["mhvillage"])
+    table["status"] = pd.Categorical(table["status"], ["both", "LARA only", "MHVillage only"])
+    return table
+
+
+def link_summary(links):
+    """Number of communities per status."""
+    return links["status"].value_counts(sort=False).rename("communities")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Link LARA records to MHVillage listings.")
+    parser.add_argument("out", help="CSV to write the linked community table to")
+    args = parser.parse_args()
+
+    lara, mhvillage = get("lara"), get("mhvillage")
+    start = time.perf_counter()
+    links = link_communities(lara, mhvillage)
+    seconds = time.perf_counter() - start
+    print(f"Linked {len(lara)} LARA and {len(mhvillage)} MHVillage records in {seconds:.2f}s")
+    print(link_summary(links).to_string())
+    links.to_csv(args.out, index=False)
+    print(f"Wrote {args.out}")
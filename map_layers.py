@@ -1,44 +1,38 @@
 # map_layers.py
-import json
-from geopy.geocoders import Nominatim
-from shapely.geometry import Point, shape
-from ipywidgets import Label, Layout
+import html
+import math
+import weakref
+from functools import partial
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+from ipywidgets import HTML, Layout
 import ipyleaflet as L
-from ipyleaflet import GeoJSON, LayerGroup
+from branca.colormap import linear
+from ipyleaflet import GeoJSON, LayerGroup, VectorTileLayer
 
+from aggregates import cube_slice
+from clustering import ClusterIndex
+from districting import find_districts
 from data_store import (
-    mhvillage_df,
-    lara_df,
-    house_districts_geojson_path,
-    senate_districts_geojson_path,
-    circlelist_lara,
-    circlelist_mh,
-    mklist_lara,
-    mklist_mh,
-    upper_layers,
-    lower_layers,
+    district_geojson,
+    district_level,
+    get,
+    layer_cache,
 )
+from geocoding import geocode
+from region_index import region_key
+from tile_server import is_mounted, tile_url
 
 # ---- Geocoding helpers ----
 def geocode_address(address: str):
-    geolocator = Nominatim(user_agent="your_application_name")
-    location = geolocator.geocode(address)
-    if location:
-        return location.latitude, location.longitude
-    return None, None
+    return geocode(address)
 
 
 def check_legislative_district(lat, lng, districts_geojson_path):
-    point = Point(lng, lat)
-    districts = gpd.read_file(districts_geojson_path)
-    spatial_index = districts.sindex
-    possible_matches_index = list(spatial_index.query(point))
-    possible_matches = districts.iloc[possible_matches_index]
-    precise_matches = possible_matches[possible_matches.contains(point)]
-
-    if not precise_matches.empty:
-        return precise_matches.iloc[0]["NAME"]
-    return None
+    # The boundaries are read, prepared and indexed once per file.
+    return find_districts([lng], [lat], str(districts_geojson_path), "NAME")[0]
 
 
 def find_geojson_centroid(geojson_feature):
@@ -46,125 +40,476 @@ def find_geojson_centroid(geojson_feature):
     return geom.centroid.coords[0]  # (lon, lat)
 
 
-def build_district_layers(upper: int = 0):
+def build_district_layers(upper: int = 0, zoom=6):
     layer_group = LayerGroup()
-    label = Label(layout=Layout(width="100%"))
 
     if upper == 1:
         color = "green"
-        geojson_path = senate_districts_geojson_path
+        chamber = "senate"
         name = "Michigan Senate Legislative Districts"
     else:
         color = "purple"
-        geojson_path = house_districts_geojson_path
+        chamber = "house"
         name = "Michigan House Legislative Districts"
 
-    with open(geojson_path, "r") as f:
-        michigan_districts_data = json.load(f)
+    if is_mounted():
+        # Only the tiles in view are fetched, from the endpoint in tile_server.
+        layerk = VectorTileLayer(
+            url=tile_url(chamber),
+            name=name,
+            vector_tile_layer_styles={
+                chamber: {
+                    "color": color,
+                    "weight": 1,
+                    "fill": True,
+                    "fillColor": color,
+                    "fillOpacity": 0.3,
+                }
+            },
+        )
+    else:
+        layerk = GeoJSON(
+            data=district_geojson(chamber, zoom),
+            name=name,
+            style={"color": color, "weight": 1, "fillOpacity": 0.3},
+            hover_style={"color": "orange", "weight": 3},
+        )
+
+    layer_group.add_layer(layerk)
+    return layer_group
+
 
-    layerk = GeoJSON(
-        data=michigan_districts_data,
-        name=name,
-        style={"color": color, "weight": 1, "fillOpacity": 0.3},
-        hover_style={"color": "orange", "weight": 3},
+# ---- District choropleths ----
+# measure -> (source in the aggregates cube, label)
+CHOROPLETH_MEASURES = {
+    "communities": ("LARA", "number of communities"),
+    "total_sites": ("LARA", "number of sites"),
+    "mean_rent": ("MHVillage", "average rent"),
+}
+NO_DATA_COLOR = "#cccccc"
+
+
+def choropleth_geojson(chamber, measure, zoom):
+    """District boundaries for `zoom` with the measure and a ready-made fill
+    style in every feature's properties, built once per data version."""
+    level = district_level(zoom) or "full"
+    return layer_cache.get(
+        f"{chamber}_districts",
+        f"choropleth_{measure}_{level}",
+        partial(_build_choropleth, chamber, measure, zoom),
     )
 
-    layer_group.add_layer(layerk)
 
-    if upper == 1:
-        upper_layers.append(layer_group)
-    else:
-        lower_layers.append(layer_group)
+def _build_choropleth(chamber, measure, zoom):
+    source, label = CHOROPLETH_MEASURES[measure]
+    geography = "Senate district" if chamber == "senate" else "House district"
+    values = cube_slice(source, geography)[measure].dropna()
+    colormap = linear.YlOrRd_09.scale(0, float(values.max()))
+    # Counts are 0 where a district has no communities; a rent is just unknown.
+    missing = None if measure == "mean_rent" else 0
+
+    features = []
+    for feature in district_geojson(chamber, zoom)["features"]:
+        properties = feature["properties"]
+        value = values.get(region_key(int(properties["LABEL"])), missing)
+        fill = NO_DATA_COLOR if value is None else colormap(value)
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": feature["geometry"],
+                "properties": {
+                    **properties,
+                    label: None if value is None else round(float(value), 2),
+                    "style": {"fillColor": fill},
+                },
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def build_choropleth_layer(chamber, measure, zoom):
+    return GeoJSON(
+        name=f"{chamber} districts by {CHOROPLETH_MEASURES[measure][1]}",
+        data=choropleth_geojson(chamber, measure, zoom),
+        style={"color": "black", "weight": 1, "fillOpacity": 0.6},
+        hover_style={"weight": 3, "fillOpacity": 0.8},
+    )
+
+
+def _source(LARA_C: int):
+    return "lara" if LARA_C else "mhvillage"
+
+
+def _display(col, missing="missing"):
+    """`col` as display strings, with `missing` in place of NA."""
+    return col.astype("string").fillna(missing)
 
-    return layer_group
 
+def marker_frame(df, LARA_C: int):
+    """Coordinates and hover titles of every community in `df` that has usable
+    coordinates, computed a column at a time."""
+    lat = pd.to_numeric(df["latitude"], errors="coerce")
+    lon = pd.to_numeric(df["longitude"], errors="coerce")
+    valid = lat.notna() & lon.notna() & ~((lat == 0) & (lon == 0))
+
+    districts_known = df["House district"].notna() & df["Senate district"].notna()
+    house = _display(df["House district"].astype("Int16").where(districts_known))
+    senate = _display(df["Senate district"].astype("Int16").where(districts_known))
 
-def build_marker_layer(LARA_C: int):
     if not LARA_C:
-        if circlelist_mh and mklist_mh:
-            return
-        for ind in range(len(mhvillage_df)):
-            lon = float(mhvillage_df["longitude"].iloc[ind])
-            lat = float(mhvillage_df["latitude"].iloc[ind])
-
-            # handle missing
-            if pd.isna(mhvillage_df["House district"].iloc[ind]) or pd.isna(
-                mhvillage_df["Senate district"].iloc[ind]
-            ):
-                house_mh = "missing"
-                senate_mh = "missing"
-            else:
-                house_mh = round(mhvillage_df["House district"].iloc[ind])
-                senate_mh = round(mhvillage_df["Senate district"].iloc[ind])
-
-            if pd.isna(mhvillage_df["Sites"].iloc[ind]):
-                mhsites = "missing"
-            else:
-                mhsites = round(mhvillage_df["Sites"].iloc[ind])
-
-            markeri = L.Marker(
-                location=(lat, lon),
+        sites = _display(pd.to_numeric(df["Sites"]).round().astype("Int32"))
+        title = (
+            _display(df["Name"], "nan")
+            + " , number of sites: " + sites
+            + " , average rent: " + _display(df["Average_rent"].astype("float64"), "nan")
+            + " , House district: " + house
+            + " , Senate district: " + senate
+            + " , url: " + _display(df["Url"], "nan")
+            + " , MHVillage"
+        )
+    else:
+        sites = _display(pd.to_numeric(df["Total_#_Sites"]).round().astype("Int32"))
+        title = (
+            _display(df["Owner / Community_Name"], "nan")
+            + " , number of sites: " + sites
+            + " , House district: " + house
+            + " , Senate district: " + senate
+            + ", LARA"
+        )
+
+    return pd.DataFrame({"latitude": lat, "longitude": lon, "title": title})[valid]
+
+
+_WORLD = ((-85.0, -180.0), (85.0, 180.0))
+
+
+def _padded_bounds(the_map, pad=0.25):
+    """The map's bounds grown by `pad` of their size on every side, so a short
+    pan doesn't uncover an empty edge. The whole world until the browser has
+    reported the bounds."""
+    if not the_map.bounds:
+        return _WORLD
+    (south, west), (north, east) = the_map.bounds
+    dlat, dlon = (north - south) * pad, (east - west) * pad
+    return (south - dlat, west - dlon), (north + dlat, east + dlon)
+
+
+# ---- Viewport markers ----
+# Most markers sent for one view. A state-wide view at zoom 6 holds every
+# community; the cap keeps it to the largest ones until the user zooms in.
+MAX_MARKERS = 300
+
+
+def _build_marker_index(LARA_C: int):
+    """Marker positions of one source, largest communities first, with the
+    row label of each one in the source table and a spatial index over their
+    coordinates."""
+    df = get(_source(LARA_C))
+    frame = marker_frame(df, LARA_C)
+    sites = pd.to_numeric(df.loc[frame.index, "Total_#_Sites" if LARA_C else "Sites"])
+    frame = (
+        frame[["latitude", "longitude"]]
+        .assign(row=frame.index, sites=sites)
+        .sort_values("sites", ascending=False, kind="stable", na_position="last")
+        .reset_index(drop=True)
+    )
+    return frame, shapely.STRtree(shapely.points(frame["longitude"], frame["latitude"]))
+
+
+def marker_index(LARA_C: int):
+    return layer_cache.get(_source(LARA_C), "markers", partial(_build_marker_index, LARA_C))
+
+
+def visible_markers(LARA_C: int, bounds, limit=MAX_MARKERS):
+    """Positions of the markers inside `bounds`, largest communities first,
+    at most `limit` of them."""
+    _, tree = marker_index(LARA_C)
+    (south, west), (north, east) = bounds
+    return np.sort(tree.query(shapely.box(west, south, east, north)))[:limit]
+
+
+# source -> (label, column) rows of a marker's popup
+DETAIL_FIELDS = {
+    "lara": [
+        ("Community", "DBA"),
+        ("Owner", "Owner / Community_Name"),
+        ("Address", "Location_Address"),
+        ("County", "County"),
+        ("Number of sites", "Total_#_Sites"),
+        ("House district", "House district"),
+        ("Senate district", "Senate district"),
+        ("Operator", "Operator_Name"),
+        ("Operator phone", "Operator_Phone"),
+        ("License status", "Status"),
+        ("Issued", "Issued_Date"),
+        ("Expires", "Expiration_Date"),
+    ],
+    "mhvillage": [
+        ("Community", "Name"),
+        ("Address", "FullstreetAddress"),
+        ("County", "County"),
+        ("Number of sites", "Sites"),
+        ("Average rent", "Average_rent"),
+        ("House district", "House district"),
+        ("Senate district", "Senate district"),
+    ],
+}
+
+
+def _detail(value):
+    if pd.isna(value):
+        return "missing"
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%m/%d/%Y")
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def marker_details(LARA_C: int, i):
+    """Popup HTML for marker `i`, looked up only when it is clicked."""
+    frame, _ = marker_index(LARA_C)
+    row = get(_source(LARA_C)).loc[frame["row"].iat[i]]
+    lines = [
+        f"<b>{label}:</b> {html.escape(_detail(row[column]))}"
+        for label, column in DETAIL_FIELDS[_source(LARA_C)]
+    ]
+    if LARA_C:
+        lines.append("<i>LARA</i>")
+    else:
+        if not pd.isna(row["Url"]):
+            lines.append(f'<a href="{html.escape(row["Url"])}" target="_blank">Listing on MHVillage</a>')
+        lines.append("<i>MHVillage</i>")
+    return "<br>".join(lines)
+
+
+# The one details popup of each map, moved to whichever marker was clicked.
+_map_popups = weakref.WeakKeyDictionary()
+
+
+def _show_details(map_ref, LARA_C: int, i, **event):
+    the_map = map_ref()
+    if the_map is None:
+        return
+    # Anchored to the marker rather than event["coordinates"], the click point.
+    frame, _ = marker_index(LARA_C)
+    location = (float(frame["latitude"].iat[i]), float(frame["longitude"].iat[i]))
+    details = marker_details(LARA_C, i)
+
+    popup = _map_popups.get(the_map)
+    if popup is None:
+        popup = L.Popup(location=location, child=HTML(details), max_width=400)
+        _map_popups[the_map] = popup
+        the_map.add(popup)
+    else:
+        popup.child.value = details
+        popup.location = location
+        popup.open_popup(location)
+
+
+# The pin of the last searched address on each map.
+_map_pins = weakref.WeakKeyDictionary()
+
+
+def show_location(the_map, lat, lon, zoom=10):
+    """Pin (lat, lon) on the map and center it there."""
+    pin = _map_pins.get(the_map)
+    if pin is None:
+        pin = L.Marker(location=(lat, lon), draggable=False, name="searched address")
+        _map_pins[the_map] = pin
+        the_map.add(pin)
+    else:
+        pin.location = (lat, lon)
+    the_map.center = (lat, lon)
+    the_map.zoom = max(the_map.zoom, zoom)
+
+
+# Markers each marker layer has already sent to the browser, by position.
+_layer_markers = weakref.WeakKeyDictionary()
+
+
+def update_marker_layer(the_map, layer, LARA_C: int, bounds):
+    """Bring a marker layer in line with `bounds`: only the markers that just
+    came into view are created (and sent), and those that left it are closed.
+    A marker carries only its position in the marker index; its details are
+    looked up when it is clicked."""
+    frame, _ = marker_index(LARA_C)
+    shown = _layer_markers.setdefault(layer, {})
+    wanted = visible_markers(LARA_C, bounds).tolist()
+
+    for i in wanted:
+        if i not in shown:
+            marker = L.Marker(
+                location=(float(frame["latitude"].iat[i]), float(frame["longitude"].iat[i])),
                 draggable=False,
-                title=str(mhvillage_df["Name"].iloc[ind])
-                + " , number of sites: "
-                + str(mhsites)
-                + " , average rent: "
-                + str(mhvillage_df["Average_rent"].iloc[ind])
-                + " , House district: "
-                + str(house_mh)
-                + " , Senate district: "
-                + str(senate_mh)
-                + " , url: %s" % str(mhvillage_df["Url"].iloc[ind])
-                + " , MHVillage",
+                name=str(i),
             )
-            circleMHi = L.Circle(location=(lat, lon), radius=1, color="orange", fill_color="orange")
-            circlelist_mh.append(circleMHi)
-            mklist_mh.append(markeri)
-    else:
-        if circlelist_lara and mklist_lara:
-            return
-        for ind in range(len(lara_df)):
-            lon = float(lara_df["longitude"].iloc[ind])
-            lat = float(lara_df["latitude"].iloc[ind])
-
-            if lon == 0 and lat == 0:
-                continue
-
-            if pd.isna(lara_df["House district"].iloc[ind]) or pd.isna(
-                lara_df["Senate district"].iloc[ind]
-            ):
-                house_lara = "missing"
-                senate_lara = "missing"
-            else:
-                house_lara = int(lara_df["House district"].iloc[ind])
-                senate_lara = int(lara_df["Senate district"].iloc[ind])
-
-            if pd.isna(lara_df["Total_#_Sites"].iloc[ind]):
-                larasites = "missing"
-            else:
-                larasites = round(lara_df["Total_#_Sites"].iloc[ind])
-
-            try:
-                markeri = L.Marker(
-                    location=(lat, lon),
-                    draggable=False,
-                    title=str(lara_df["Owner / Community_Name"].iloc[ind])
-                    + " , number of sites: "
-                    + str(larasites)
-                    + " , House district: "
-                    + str(house_lara)
-                    + " , Senate district: "
-                    + str(senate_lara)
-                    + ", LARA",
-                )
-                circlei = L.Circle(location=(lat, lon), radius=1, color="blue", fill_color="blue")
-                circlelist_lara.append(circlei)
-                mklist_lara.append(markeri)
-            except Exception:
-                continue
-
-
-def create_map(basemap, layerlist):
+            # Weakly, so that _layer_markers never keeps the map alive.
+            marker.on_click(partial(_show_details, weakref.ref(the_map), LARA_C, i))
+            shown[i] = marker
+    gone = [shown.pop(i) for i in set(shown).difference(wanted)]
+    layer.markers = tuple(shown[i] for i in wanted)
+    for marker in gone:
+        marker.close()
+
+
+def build_marker_layer(LARA_C: int, the_map):
+    layer = L.MarkerCluster(name="location markers")
+    update_marker_layer(the_map, layer, LARA_C, _padded_bounds(the_map))
+    return layer
+
+
+def circle_geojson(LARA_C: int):
+    """Every community of one source as a single FeatureCollection of points.
+    A feature may carry its own `style` property to override the layer's
+    point_style."""
+    return layer_cache.get(_source(LARA_C), "circles", partial(_build_circle_geojson, LARA_C))
+
+
+def _build_circle_geojson(LARA_C: int):
+    frame = marker_frame(get(_source(LARA_C)), LARA_C)
+    # 6 decimals is ~0.1 m, far below what a circle marker can show.
+    coords = zip(frame["longitude"].round(6).tolist(), frame["latitude"].round(6).tolist())
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lon, lat]}, "properties": {}}
+            for lon, lat in coords
+        ],
+    }
+
+
+def build_circle_layer(LARA_C: int):
+    """One GeoJSON layer drawn as canvas circle markers, instead of one
+    L.Circle widget per community."""
+    color = "blue" if LARA_C else "orange"
+    return GeoJSON(
+        name="location circles MH" if LARA_C else "location circles",
+        data=circle_geojson(LARA_C),
+        point_style={"radius": 2, "color": color, "fillColor": color, "fillOpacity": 1, "weight": 1},
+    )
+
+
+# ---- Server-side clusters ----
+def _build_cluster_index(LARA_C: int):
+    df = get(_source(LARA_C))
+    frame = marker_frame(df, LARA_C)
+    sites = pd.to_numeric(df.loc[frame.index, "Total_#_Sites" if LARA_C else "Sites"])
+    return frame, ClusterIndex(frame["longitude"], frame["latitude"], sites)
+
+
+def cluster_index(LARA_C: int):
+    return layer_cache.get(_source(LARA_C), "clusters", partial(_build_cluster_index, LARA_C))
+
+def cluster_geojson(LARA_C: int, bounds, zoom):
+    """Clusters in `bounds` at `zoom`, sized by their total number of sites."""
+    frame, index = cluster_index(LARA_C)
+    features = []
+    for cluster in index.clusters(bounds, zoom):
+        properties = {
+            "count": cluster["count"],
+            "sites": int(cluster["weight"]),
+            "style": {"radius": min(30.0, 4 + 5 * math.log10(1 + cluster["weight"]))},
+        }
+        if cluster["point"] is not None:
+            properties["title"] = frame["title"].iloc[cluster["point"]]
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [cluster["lon"], cluster["lat"]]},
+                "properties": properties,
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+def build_cluster_layer(LARA_C: int, the_map):
+    color = "blue" if LARA_C else "orange"
+    return GeoJSON(
+        name="site clusters LARA" if LARA_C else "site clusters MHVillage",
+        data=cluster_geojson(LARA_C, _padded_bounds(the_map), the_map.zoom),
+        point_style={"color": color, "fillColor": color, "fillOpacity": 0.5, "weight": 1},
+    )
+
+
+SENATE_LAYER = "Legislative districts (Michigan State Senate)"
+HOUSE_LAYER = "Legislative districts (Michigan State House of Representatives)"
+# layer name -> LARA_C
+MARKER_LAYERS = {"Marker MHVillage": 0, "Marker LARA": 1}
+# layer name -> (chamber, measure)
+CHOROPLETH_LAYERS = {
+    "House districts shaded by number of communities (LARA)": ("house", "communities"),
+    "House districts shaded by number of sites (LARA)": ("house", "total_sites"),
+    "House districts shaded by average rent (MHVillage)": ("house", "mean_rent"),
+    "Senate districts shaded by number of communities (LARA)": ("senate", "communities"),
+    "Senate districts shaded by number of sites (LARA)": ("senate", "total_sites"),
+    "Senate districts shaded by average rent (MHVillage)": ("senate", "mean_rent"),
+}
+# layer name -> LARA_C
+CLUSTER_LAYERS = {
+    "Cluster MHVillage (sized by number of sites)": 0,
+    "Cluster LARA (sized by number of sites)": 1,
+}
+
+
+def build_layer(name, the_map):
+    """Build the map layer for one of the choices in ui_layout.layernames."""
+    if name == SENATE_LAYER:
+        return build_district_layers(upper=1, zoom=the_map.zoom)
+    if name == HOUSE_LAYER:
+        return build_district_layers(upper=0, zoom=the_map.zoom)
+    if name in CHOROPLETH_LAYERS:
+        return build_choropleth_layer(*CHOROPLETH_LAYERS[name], zoom=the_map.zoom)
+    if name in CLUSTER_LAYERS:
+        return build_cluster_layer(CLUSTER_LAYERS[name], the_map)
+    if name in MARKER_LAYERS:
+        return build_marker_layer(MARKER_LAYERS[name], the_map)
+    if name == "Circle MHVillage (location only)":
+        return build_circle_layer(LARA_C=0)
+    if name == "Circle LARA (location only)":
+        return build_circle_layer(LARA_C=1)
+    raise KeyError(f"Unknown map layer {name!r}")
+
+
+# Layers currently shown on each map, by layer name.
+_map_layers = weakref.WeakKeyDictionary()
+
+
+def set_layers(the_map, layerlist):
+    """Bring the map's layers in line with `layerlist`, adding and removing only
+    the layers whose selection changed."""
+    current = _map_layers.setdefault(the_map, {})
+    for name in list(current):
+        if name not in layerlist:
+            the_map.remove(current.pop(name))
+    for name in layerlist:
+        if name not in current:
+            current[name] = build_layer(name, the_map)
+            the_map.add(current[name])
+
+
+def set_basemap(the_map, basemap):
+    """Swap the map's base tiles for `basemap`, keeping every other layer."""
+    old = next(layer for layer in the_map.layers if layer.base)
+    new = L.basemap_to_tiles(basemap)
+    if new.url == old.url:
+        return
+    new.base = True
+    the_map.substitute(old, new)
+
+
+def _forget_map(change):
+    """Drop a closed map's layers, markers, popup and pin."""
+    if change["new"] is not None:
+        return
+    the_map = change["owner"]
+    for layer in _map_layers.pop(the_map, {}).values():
+        _layer_markers.pop(layer, None)
+    _map_popups.pop(the_map, None)
+    _map_pins.pop(the_map, None)
+
+
+def create_map(basemap, layerlist=()):
     the_map = L.Map(
         basemap=basemap,
         center=[44.44343571548758, -84.36155640717737],
@@ -174,40 +519,36 @@ def create_map(basemap, layerlist):
         scroll_wheel_zoom=True,
     )
 
-    markerorcircle = False
-
-    if "Legislative districts (Michigan State Senate)" in layerlist:
-        build_district_layers(upper=1)
-        the_map.add_layer(upper_layers[0])
-
-    if "Legislative districts (Michigan State House of Representatives)" in layerlist:
-        build_district_layers(upper=0)
-        the_map.add_layer(lower_layers[0])
-
-    if "Marker MHVillage" in layerlist:
-        build_marker_layer(LARA_C=0)
-        marker_cluster = L.MarkerCluster(name="location markers", markers=tuple(mklist_mh))
-        the_map.add_layer(marker_cluster)
-        markerorcircle = True
-
-    if "Marker LARA" in layerlist:
-        build_marker_layer(LARA_C=1)
-        marker_cluster = L.MarkerCluster(name="location markers", markers=tuple(mklist_lara))
-        the_map.add_layer(marker_cluster)
-        markerorcircle = True
-
-    if "Circle MHVillage (location only)" in layerlist:
-        if not markerorcircle:
-            build_marker_layer(LARA_C=0)
-        layergroup = L.LayerGroup(name="location circles", layers=circlelist_mh)
-        the_map.add_layer(layergroup)
-        markerorcircle = True
-
-    if "Circle LARA (location only)" in layerlist:
-        if not markerorcircle:
-            build_marker_layer(LARA_C=1)
-        layergroup = L.LayerGroup(name="location circles MH", layers=circlelist_lara)
-        the_map.add_layer(layergroup)
-        markerorcircle = True
-
-    return the_map
\ No newline at end of file
+    # GeoJSON boundaries (no tile service) and choropleths: swap in a finer or
+    # coarser copy of them when the zoom crosses a level.
+    def update_district_detail(change):
+        if district_level(change["new"]) == district_level(change["old"]):
+            return
+        current = _map_layers.get(the_map, {})
+        for name, chamber in ((SENATE_LAYER, "senate"), (HOUSE_LAYER, "house")):
+            if name in current and isinstance(current[name].layers[0], GeoJSON):
+                current[name].layers[0].data = district_geojson(chamber, change["new"])
+        for name, (chamber, measure) in CHOROPLETH_LAYERS.items():
+            if name in current:
+                current[name].data = choropleth_geojson(chamber, measure, change["new"])
+
+    the_map.observe(update_district_detail, names="zoom")
+
+    # Re-query the server-side clusters and the markers in view after every
+    # pan/zoom.
+    def update_viewport(change):
+        current = _map_layers.get(the_map, {})
+        bounds = _padded_bounds(the_map)
+        for name, LARA_C in CLUSTER_LAYERS.items():
+            if name in current:
+                current[name].data = cluster_geojson(LARA_C, bounds, the_map.zoom)
+        for name, LARA_C in MARKER_LAYERS.items():
+            if name in current:
+                update_marker_layer(the_map, current[name], LARA_C, bounds)
+
+    the_map.observe(update_viewport, names="bounds")
+    # Widget.close() sets comm to None.
+    the_map.observe(_forget_map, names="comm")
+
+    set_layers(the_map, layerlist)
+    return the_map
@@ -31,12 +31,13 @@ import re
 # from regex_add import regex, regex1
 import geopy
 from geopy.geocoders import Nominatim, GoogleV3
+from geocoding import CachedGeocoder
 
 
 # !!!!!!!!!! free but doesn't work as well as google API
-geolocator = Nominatim(user_agent="you're email")
+geolocator = CachedGeocoder(Nominatim(user_agent="you're email"))
 ##
-#geolocator = GoogleV3(api_key='')
+#geolocator = CachedGeocoder(GoogleV3(api_key=''))
 
 # two functions from medium article: 
 # link:https://towardsdatascience.com/transform-messy-address-into-clean-data-effortlessly-using-geopy-and-python-d3f726461225
@@ -0,0 +1,327 @@
+"""
+Geocodes addresses from local reference files instead of a web service.
+
+Two kinds of reference data are supported, either or both at once:
+    1) Address points, e.g. an OpenAddresses CSV (LON, LAT, NUMBER, STREET,
+       POSTCODE columns). A house number found on its street is answered with
+       its own point; a number between two known ones on its side of the
+       street (odd or even) is interpolated
+    2) Address ranges, e.g. a TIGER/Line ADDRFEAT shapefile (FULLNAME,
+       LFROMHN, LTOHN, RFROMHN, RTOHN, ZIPL, ZIPR and the street line). The
+       number is placed along the segment whose range on the matching side
+       (odd or even) holds it
+
+Streets are matched on their canonical form (addresses.normalize_addresses)
+within a ZIP code; an address without a ZIP, or with one the street is not
+in, is matched when its street exists in a single ZIP. Each file is read once
+per process and indexed by (street, ZIP).
+
+OfflineGeocoder has geopy's geocode(query), so it can replace the geolocator
+of the address-cleaning scripts or go into geocode_pipeline. Addresses it
+cannot place go to `fallback` (e.g. a CachedGeocoder around Nominatim), if
+one is given. In a script, with the state's county ADDRFEAT files merged:
+    geolocator = OfflineGeocoder(ranges=load_address_ranges(path), fallback=geolocator)
+
+Geocode a column of a CSV:
+    python offline_geocoder.py dataIL/MHVillage_IL_Parks.csv Address out.csv --ranges tl_2023_17031_addrfeat.shp
+    python offline_geocoder.py source.csv Address out.csv --points us_il.csv --fallback nominatim
+"""
+
+# -----------------------------
+# Imports
+# -----------------------------
+import argparse
+import time
+from functools import lru_cache
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from geopy.location import Location
+
+from addresses import normalize_addresses, normalize_zips
+from geocoding import CachedGeocoder
+from geocode_pipeline import geocode_many, make_provider, print_metrics, provider_name
+
+# Unit designators ending a street part, e.g. "12 MAIN ST APT 4" or "LOT 17".
+_UNIT = r"\s+(?:APT|STE|UNIT|LOT|SPC|SPACE|TRLR|#)\s*\S*$|\s*#\S*$"
+
+
+# -----------------------------
+# Parsing
+# -----------------------------
+def _without_unit(streets):
+    streets = streets.str.replace(_UNIT, "", regex=True)
+    return streets.mask(streets == "")
+
+
+def _streets(streets):
+    """Canonical street names, without a trailing unit."""
+    return _without_unit(normalize_addresses(streets))
+
+
+def split_addresses(addresses):
+    """Frame of number, street and zip for free-form addresses such as
+    "323 LeGrand Blvd., White Lake Twp., MI 48383". The street is the part
+    before the first comma, and the ZIP the last one after it."""
+    text = pd.Series(addresses).astype("string")
+    parts = text.str.split(",", n=1, expand=True).reindex(columns=[0, 1]).astype("string")
+    street = normalize_addresses(parts[0]).str.extract(r"^(\d+)[A-Z]?\s+(.+)$")
+    return pd.DataFrame(
+        {
+            "number": pd.to_numeric(street[0], errors="coerce"),
+            "street": _without_unit(street[1]),
+            "zip": parts[1].str.extract(r"(\d{5})(?:-\d{4})?\D*$", expand=False),
+        },
+        index=text.index,
+    )
+
+
+# -----------------------------
+# Reference indexes
+# -----------------------------
+class _StreetIndex:
+    """Entries grouped by (street, zip), plus the ZIPs of every street."""
+
+    def __init__(self, frame, build):
+        frame = frame.dropna(subset=["street"])
+        frame = frame.assign(zip=frame["zip"].fillna(""))
+        self.entries = {key: build(group) for key, group in frame.groupby(["street", "zip"], sort=False)}
+        self.zips = frame.groupby("street")["zip"].unique().to_dict()
+        self.size = len(frame)
+
+    def entry(self, street, zip_code):
+        if (street, zip_code) in self.entries:
+            return self.entries[street, zip_code]
+        zips = self.zips.get(street)
+        if zips is not None and len(zips) == 1:
+            return self.entries[street, zips[0]]
+        return None
+
+
+class AddressPoints(_StreetIndex):
+    """Index of address points: per street and ZIP, and per side of the street
+    (odd or even numbers), the house numbers in ascending order with their
+    coordinates."""
+
+    source = "points"
+
+    def __init__(self, frame):
+        frame = frame.dropna(subset=["number", "latitude", "longitude"])
+        super().__init__(frame, self._build)
+
+    @staticmethod
+    def _build(group):
+        group = group.sort_values("number", kind="stable")
+        numbers = group["number"].to_numpy("float64")
+        lat = group["latitude"].to_numpy("float64")
+        lon = group["longitude"].to_numpy("float64")
+        sides = {}
+        for parity in (0, 1):
+            side = numbers % 2 == parity
+            sides[parity] = numbers[side], lat[side], lon[side]
+        return sides
+
+    def find(self, number, street, zip_code):
+        """(latitude, longitude, exact) of the address, or None."""
+        entry = self.entry(street, zip_code)
+        if entry is None:
+            return None
+        # Only numbers on the same side of the street are interpolated between.
+        numbers, lat, lon = entry[number % 2]
+        i = np.searchsorted(numbers, number)
+        if i < len(numbers) and numbers[i] == number:
+            return lat[i], lon[i], True
+        if i == 0 or i == len(numbers):
+            return None
+        share = (number - numbers[i - 1]) / (numbers[i] - numbers[i - 1])
+        return (
+            lat[i - 1] + share * (lat[i] - lat[i - 1]),
+            lon[i - 1] + share * (lon[i] - lon[i - 1]),
+            False,
+        )
+
+
+class AddressRanges(_StreetIndex):
+    """Index of address ranges: per street and ZIP, the (from, to) house
+    numbers of each side of each segment and the segment's line."""
+
+    source = "ranges"
+
+    def __init__(self, frame):
+        frame = frame.dropna(subset=["start", "end", "geometry"])
+        super().__init__(frame, self._build)
+
+    @staticmethod
+    def _build(group):
+        start = group["start"].to_numpy("float64")
+        end = group["end"].to_numpy("float64")
+        return np.minimum(start, end), np.maximum(start, end), start, end, group["geometry"].to_numpy()
+
+    def find(self, number, street, zip_code):
+        """(latitude, longitude, exact) of the address, or None."""
+        entry = self.entry(street, zip_code)
+        if entry is None:
+            return None
+        low, high, start, end, lines = entry
+        # Numbers on one side of a street share their parity.
+        hits = np.flatnonzero((low <= number) & (number <= high) & (start % 2 == number % 2))
+        if not len(hits):
+            return None
+        i = hits[0]
+        share = 0.5 if start[i] == end[i] else (number - start[i]) / (end[i] - start[i])
+        point = shapely.line_interpolate_point(lines[i], share, normalized=True)
+        return point.y, point.x, False
+
+
+def _column(df, name):
+    """Column `name` of `df`, ignoring case (OpenAddresses has used both)."""
+    columns = {column.lower(): column for column in df.columns}
+    if name.lower() in columns:
+        return df[columns[name.lower()]]
+    return pd.Series(pd.NA, index=df.index, dtype="string")
+
+
+@lru_cache(maxsize=None)
+def load_address_points(path):
+    """AddressPoints of an OpenAddresses CSV."""
+    df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+    frame = pd.DataFrame(
+        {
+            "number": pd.to_numeric(_column(df, "NUMBER").str.extract(r"^(\d+)", expand=False), errors="coerce"),
+            "street": _streets(_column(df, "STREET")),
+            "zip": normalize_zips(_column(df, "POSTCODE")),
+            "latitude": pd.to_numeric(_column(df, "LAT"), errors="coerce"),
+            "longitude": pd.to_numeric(_column(df, "LON"), errors="coerce"),
+        }
+    )
+    return AddressPoints(frame)
+
+
+@lru_cache(maxsize=None)
+def load_address_ranges(path):
+    """AddressRanges of a TIGER/Line ADDRFEAT file (or anything with its
+    columns), one entry per side of each segment."""
+    gdf = gpd.read_file(path)
+    if gdf.crs is not None and gdf.crs.to_epsg() != 4326:
+        gdf = gdf.to_crs(4326)
+    street = _streets(gdf["FULLNAME"])
+    sides = [
+        pd.DataFrame(
+            {
+                "street": street,
+                "zip": normalize_zips(gdf[zip_col]),
+                "start": pd.to_numeric(gdf[start], errors="coerce"),
+                "end": pd.to_numeric(gdf[end], errors="coerce"),
+                "geometry": gdf.geometry.values,
+            }
+        )
+        for start, end, zip_col in (("LFROMHN", "LTOHN", "ZIPL"), ("RFROMHN", "RTOHN", "ZIPR"))
+    ]
+    return AddressRanges(pd.concat(sides, ignore_index=True))
+
+
+# -----------------------------
+# Geocoder
+# -----------------------------
+class OfflineGeocoder:
+    """geopy-style geocoder answering from local indexes (AddressPoints are
+    tried before AddressRanges), and from `fallback` for the rest."""
+
+    def __init__(self, points=None, ranges=None, fallback=None):
+        self.indexes = [index for index in (points, ranges) if index is not None]
+        self.fallback = fallback
+        self.provider = "offline" if fallback is None else f"offline+{provider_name(fallback)}"
+        self.local = 0
+        self.fallbacks = 0
+
+    def _find(self, number, street, zip_code):
+        if pd.isna(number) or pd.isna(street):
+            return None
+        zip_code = "" if pd.isna(zip_code) else zip_code
+        for index in self.indexes:
+            found = index.find(number, street, zip_code)
+            if found is not None:
+                lat, lon, exact = found
+                address = f"{int(number)} {street}, {zip_code}".rstrip(", ")
+                raw = {"source": index.source, "exact": exact}
+                return Location(address, (float(lat), float(lon)), raw)
+        return None
+
+    def locate(self, addresses):
+        """Location (or None) of every address from the local indexes only."""
+        parts = split_addresses(addresses)
+        return [self._find(*row) for row in parts.itertuples(index=False)]
+
+    def lookup(self, query):
+        """(True, answer) if the indexes (or the fallback's cache) can answer
+        `query`, else (False, None); see geocode_pipeline.geocode_all."""
+        location = self.locate([query])[0]
+        if location is not None:
+            self.local += 1
+            return True, location
+        if self.fallback is None:
+            return True, None
+        if hasattr(self.fallback, "lookup"):
+            return self.fallback.lookup(query)
+        return False, None
+
+    def geocode(self, query, **kwargs):
+        location = self.locate([query])[0]
+        if location is not None:
+            self.local += 1
+            return location
+        if self.fallback is None:
+            return None
+        self.fallbacks += 1
+        return self.fallback.geocode(query, **kwargs)
+
+
+# -----------------------------
+# Driver Script
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("source", help="CSV with an address column")
+    parser.add_argument("address_col", help="name of the address column")
+    parser.add_argument("out", help="CSV to write, with latitude, longitude and geocode_source added")
+    parser.add_argument("--points", help="OpenAddresses CSV")
+    parser.add_argument("--ranges", help="TIGER/Line ADDRFEAT shapefile")
+    parser.add_argument("--fallback", choices=["nominatim", "googlev3"], help="web service for the rest")
+    parser.add_argument("--api-key", help="API key for googlev3")
+    parser.add_argument("--rate", type=float, default=1.0, help="fallback requests per second")
+    args = parser.parse_args()
+    if not (args.points or args.ranges):
+        parser.error("give --points, --ranges or both")
+
+    start = time.perf_counter()
+    geocoder = OfflineGeocoder(
+        points=load_address_points(args.points) if args.points else None,
+        ranges=load_address_ranges(args.ranges) if args.ranges else None,
+    )
+    loaded = time.perf_counter() - start
+    df = pd.read_csv(args.source)
+    start = time.perf_counter()
+    results = geocoder.locate(df[args.address_col])
+    seconds = time.perf_counter() - start
+    source = [r.raw["source"] if r else None for r in results]
+    print(
+        f"Loaded {sum(index.size for index in geocoder.indexes)} reference entries in {loaded:.2f}s; "
+        f"placed {sum(r is not None for r in results)} of {len(df)} addresses in {seconds:.2f}s"
+    )
+
+    if args.fallback:
+        missing = [i for i, r in enumerate(results) if r is None]
+        fallback = CachedGeocoder(make_provider(args.fallback, api_key=args.api_key))
+        answers, metrics = geocode_many(df[args.address_col].iloc[missing], fallback, rate=args.rate)
+        for i, location in zip(missing, answers):
+            results[i] = location
+            source[i] = args.fallback if location else None
+        print_metrics(metrics)
+
+    df["latitude"] = [r.latitude if r else None for r in results]
+    df["longitude"] = [r.longitude if r else None for r in results]
+    df["geocode_source"] = source
+    df.to_csv(args.out, index=False)
+    print(f"Wrote {args.out}")
@@ -1,19 +1,14 @@
 # plot_utils.py
-import pandas as pd
 import seaborn as sns
 from matplotlib.ticker import FuncFormatter
-import matplotlib.pyplot as plt
 
-from data_store import lara_df, mhvillage_df
+from aggregates import county_rent_table, county_sites_table
 
 
 def build_infographics1():
     total_sites_by_name = (
-        lara_df[["County", "Total_#_Sites"]]
-        .dropna()
-        .groupby("County")
-        .sum()
-        .sort_values(by="Total_#_Sites", ascending=False)
+        county_sites_table()
+        .rename(columns={"Number of Sites": "Total_#_Sites"})
         .iloc[:20, :]
     )
     sns.set_color_codes("pastel")
@@ -26,19 +21,8 @@ def build_infographics1():
 
 
 def build_infographics2():
-    total_sites_by_name = mhvillage_df.groupby("County")["Average_rent"].mean().dropna()
-    total_sites_by_name = total_sites_by_name.sort_values(ascending=True)
-    total_sites_by_name = total_sites_by_name.to_frame().reset_index()
-
-    df_clean = mhvillage_df[["County", "Average_rent"]].dropna()
-    county_counts = df_clean["County"].value_counts().to_frame().reset_index()
-
-    total_sites_by_name_count = pd.merge(total_sites_by_name, county_counts, on="County")
-    total_sites_by_name_count = total_sites_by_name_count.sort_values(
-        by="count", ascending=False
-    )
-    total_sites_by_name_20 = total_sites_by_name_count[:20]
-    total_sites_by_name_20.sort_values("Average_rent", ascending=False, inplace=True)
+    total_sites_by_name_20 = county_rent_table()[:20]
+    total_sites_by_name_20 = total_sites_by_name_20.sort_values("Average_rent", ascending=False)
 
     ax = sns.barplot(
         x="Average_rent",
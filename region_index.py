@@ -0,0 +1,56 @@
+# region_index.py
+# Region -> row positions for the table section, built once per process so that
+# a dropdown change is a dictionary lookup plus a `take` instead of a full scan.
+import numpy as np
+
+from data_store import get, register
+
+GEOGRAPHIES = ("County", "House district", "Senate district")
+
+# datasource dropdown value -> registry dataset
+SOURCES = {
+    "LARA": "lara",
+    "MHVillage": "mhvillage",
+}
+
+_EMPTY = np.array([], dtype=np.intp)
+
+
+def region_key(value):
+    """Regions are keyed by the string the browser sends back from the dropdown."""
+    if isinstance(value, (int, np.integer)):
+        return str(int(value))
+    return str(value)
+
+
+def build_region_index(frames):
+    """Map (source, geography) -> {region: row positions} for every frame in
+    `frames` ({source: DataFrame}), along with the sorted dropdown options."""
+    rows = {}
+    options = {}
+    for source, df in frames.items():
+        for geography in GEOGRAPHIES:
+            groups = df.groupby(geography, observed=True, sort=True).indices
+            rows[(source, geography)] = {
+                region_key(region): positions for region, positions in groups.items()
+            }
+            options[(source, geography)] = [region_key(region) for region in groups]
+    return {"rows": rows, "options": options}
+
+
+def _load():
+    return build_region_index({source: get(name) for source, name in SOURCES.items()})
+
+
+register("region_index", _load)
+
+
+def region_options(source, geography):
+    """Sorted regions of `geography` that have at least one row in `source`."""
+    return list(get("region_index")["options"][(source, geography)])
+
+
+def region_rows(source, geography, region):
+    """Rows of `source` located in `region`."""
+    positions = get("region_index")["rows"][(source, geography)].get(str(region), _EMPTY)
+    return get(SOURCES[source]).take(positions)
@@ -0,0 +1,103 @@
+# schemas.py
+# Column types for the MHC tables. `data_store` applies these before a table is
+# snapshotted, so every worker loads the compact dtypes directly.
+import pandas as pd
+
+# Index columns left behind by repeated `to_csv()` calls without index=False.
+INDEX_DEBRIS = r"^Unnamed: \d+(\.\d+)?$"
+
+STRING = "string[pyarrow]"
+
+# Column kinds:
+#   "county"   - stripped, title-cased category
+#   "category" - category
+#   "district" - nullable Int16; 0 means "no district found" and becomes <NA>
+#   "count"    - nullable Int32; non-numeric values ("Not found") become <NA>
+#   "float"    - float64
+#   "date"     - datetime64, parsed from MM/DD/YYYY
+#   "string"   - Arrow-backed string
+LARA = {
+    "Record_No": "count",
+    "Status": "category",
+    "Expiration_Date": "date",
+    "DBA": "string",
+    "Owner / Community_Name": "string",
+    "Location_Address": "string",
+    "Mailing_Address": "string",
+    "County": "county",
+    "Community_Phone": "string",
+    "Total_#_Sites": "count",
+    "Issued_Date": "date",
+    "Operator_Name": "string",
+    "Operator_Phone": "string",
+    "Operator_email": "string",
+    "latitude": "float",
+    "longitude": "float",
+    "House district": "district",
+    "Senate district": "district",
+}
+
+MHVILLAGE_MI = {
+    "Name": "string",
+    "Url": "string",
+    "County": "county",
+    "Sites": "count",
+    "Average_rent": "float",
+    "FullstreetAddress": "string",
+    "Latitude": "float",
+    "Longitude": "float",
+    "latitude": "float",
+    "longitude": "float",
+    "House district": "district",
+    "Senate district": "district",
+}
+
+MHVILLAGE_IL = {
+    "Address": "string",
+    "Name": "string",
+    "City State ZIP": "string",
+    "ZIP": "count",
+    "Number of Sites": "count",
+    "Url": "string",
+    "ZIP_str": "string",
+    "FULL Address": "string",
+    "latitude": "float",
+    "longitude": "float",
+    "House district": "district",
+    "Senate district": "district",
+}
+
+
+def _category(col):
+    # Plain (not Arrow) categories, which is also what a Parquet round trip gives.
+    return pd.Series(pd.Categorical(col.to_numpy(dtype=object, na_value=None)), index=col.index)
+
+
+def _convert(col, kind):
+    if kind == "county":
+        return _category(col.astype(STRING).str.strip().str.title())
+    if kind == "category":
+        return _category(col.astype(STRING).str.strip())
+    if kind == "district":
+        col = pd.to_numeric(col, errors="coerce")
+        return col.where(col != 0).round().astype("Int16")
+    if kind == "count":
+        return pd.to_numeric(col, errors="coerce").round().astype("Int32")
+    if kind == "float":
+        return pd.to_numeric(col, errors="coerce").astype("float64")
+    if kind == "date":
+        return pd.to_datetime(col, format="%m/%d/%Y", errors="coerce")
+    if kind == "string":
+        return col.astype(STRING)
+    raise ValueError(f"Unknown column kind {kind!r}")
+
+
+def apply_schema(df, schema):
+    """Drop index debris and convert every schema column present in `df`.
+    Columns missing from `df` are skipped, so one schema covers a table and its
+    trimmed-down `*_base.csv` copy."""
+    df = df.drop(columns=df.columns[df.columns.str.match(INDEX_DEBRIS)])
+    for column, kind in schema.items():
+        if column in df.columns:
+            df[column] = _convert(df[column], kind)
+    return df
@@ -1,20 +1,63 @@
+import asyncio
 import io
 from datetime import date
+from functools import lru_cache
 import pandas as pd
 
+from geopy.exc import GeocoderRateLimited, GeocoderTimedOut, GeocoderUnavailable, GeopyError
 from shiny import reactive, render, ui
 from shinywidgets import render_widget
 
 # Imports from your refactored modules
 from ui_layout import basemaps
 from data_store import (
-    lara_df,
-    mhvillage_df,
+    TABLES,
     house_districts_geojson_path,
     senate_districts_geojson_path,
 )
-from map_layers import create_map
+from geocoding import CachedGeocoder, get_geocoder
+from geocode_pipeline import TokenBucket
+from map_layers import create_map, set_basemap, set_layers, show_location
 from plot_utils import build_infographics1, build_infographics2
+from aggregates import (
+    community_list,
+    county_rent_table,
+    county_sites_table,
+    district_communities,
+    district_summary,
+    region_summary,
+)
+from region_index import region_options
+
+# Address searches of every session share one limiter: Nominatim allows one
+# request per second per application.
+_search_limit = TokenBucket(1)
+
+
+@lru_cache(maxsize=None)
+def _search_geocoder(geocoder):
+    return CachedGeocoder(geocoder)
+
+
+async def find_address(address):
+    """(latitude, longitude) of `address`, or a message saying why there is
+    none. Cached answers are immediate; the rest wait for the limiter and are
+    geocoded on a worker thread so that other sessions are not blocked."""
+    geocoder = _search_geocoder(get_geocoder())
+    cached, location = geocoder.lookup(address)
+    if not cached:
+        await _search_limit.acquire()
+        try:
+            location = await asyncio.to_thread(geocoder.geocode, address, timeout=10)
+        except GeocoderTimedOut:
+            return "The address search timed out. Please try again."
+        except (GeocoderRateLimited, GeocoderUnavailable):
+            return "The address search service is busy. Please try again in a minute."
+        except GeopyError:
+            return "The address search service is unavailable right now. Please try again later."
+    if location is None:
+        return f"No location found for \"{address}\"."
+    return location.latitude, location.longitude
 
 
 def server(input, output, session):
@@ -25,23 +68,8 @@ def server(input, output, session):
     @reactive.Calc
     def sub_category_options():
         main_category = input.main_category()
-        df_name = input.datasource()
-
-        if main_category and df_name == "MHVillage":
-            return mhvillage_df[main_category].dropna().tolist()
-
-        elif main_category:
-            if main_category in ("House district", "Senate district"):
-                return (
-                    lara_df[main_category]
-                    .dropna()
-                    .astype(int)
-                    .unique()
-                    .tolist()
-                )
-            else:
-                return lara_df[main_category].dropna().unique().tolist()
-
+        if main_category:
+            return region_options(input.datasource(), main_category)
         return []
 
     # UI for subcategory dropdown
@@ -49,7 +77,6 @@ def server(input, output, session):
     @render.ui
     def sub_category_ui():
         options = sub_category_options()
-        options.sort()
         return ui.input_select(
             "sub_category",
             "Select district/county of interest (Note – only locations with MHC data will generate a table):",
@@ -62,9 +89,58 @@ def server(input, output, session):
     @output
     @render_widget
     def map():
-        basemap = basemaps[input.basemap()]
-        layerlist = input.layers()
-        return create_map(basemap, layerlist)
+        # Built once per session; the effects below update it in place.
+        with reactive.isolate():
+            return create_map(basemaps[input.basemap()], input.layers() or ())
+
+    @reactive.effect
+    def update_map_layers():
+        set_layers(map.widget, input.layers() or ())
+
+    @reactive.effect
+    def update_basemap():
+        set_basemap(map.widget, basemaps[input.basemap()])
+
+    # -----------------------------
+    # Find my district
+    # -----------------------------
+    @reactive.extended_task
+    async def address_search(address):
+        return await find_address(address)
+
+    @reactive.effect
+    @reactive.event(input.find_district)
+    def start_address_search():
+        address = input.address().strip()
+        if address:
+            address_search.invoke(address)
+
+    @reactive.Calc
+    def district_lookup():
+        if address_search.status() != "success":
+            return None
+        return address_search.result()
+
+    @reactive.effect
+    def show_searched_location():
+        found = district_lookup()
+        if isinstance(found, tuple):
+            show_location(map.widget, *found)
+
+    @output
+    @render.ui
+    def district_result():
+        if address_search.status() == "running":
+            return ui.p("Searching…")
+        found = district_lookup()
+        if found is None:
+            return None
+        if isinstance(found, str):
+            return ui.p(found)
+        return ui.TagList(
+            ui.HTML(district_summary(*found).to_html(index=False, border=0)),
+            ui.HTML(district_communities(*found).to_html(index=False, border=0, na_rep="")),
+        )
 
     # -----------------------------
     # Infographics
@@ -77,17 +153,8 @@ def server(input, output, session):
     @output
     @render.download(filename=lambda: "all-mhc-counts.csv")
     def download_info1():
-        df = lara_df[["County", "Total_#_Sites"]].dropna()
-        county_sites_df = (
-            df.groupby("County")["Total_#_Sites"]
-            .sum()
-            .reset_index()
-            .rename(columns={"Total_#_Sites": "Number of Sites"})
-            .sort_values("Number of Sites", ascending=False)
-        )
-
         output_stream = io.StringIO()
-        county_sites_df.to_csv(output_stream, index=False)
+        county_sites_table().to_csv(output_stream, index=False)
         output_stream.seek(0)
         return output_stream.getvalue(), ""
 
@@ -99,24 +166,8 @@ def server(input, output, session):
     @output
     @render.download(filename=lambda: "all-mhc-rents.csv")
     def download_info2():
-        total_sites = (
-            mhvillage_df.groupby("County")["Average_rent"].mean().dropna()
-        )
-
-        total_sites = (
-            total_sites.sort_values(ascending=True)
-            .to_frame()
-            .reset_index()
-        )
-
-        df_clean = mhvillage_df[["County", "Average_rent"]].dropna()
-        county_counts = df_clean["County"].value_counts().to_frame().reset_index()
-
-        combined = pd.merge(total_sites, county_counts, on="County")
-        combined = combined.sort_values("count", ascending=False)
-
         output_stream = io.StringIO()
-        combined.to_csv(output_stream, index=False)
+        county_rent_table().to_csv(output_stream, index=False)
         output_stream.seek(0)
         return output_stream.getvalue(), ""
 
@@ -125,70 +176,18 @@ def server(input, output, session):
     # -----------------------------
     @reactive.Calc
     def reactive_site_list():
+        df = community_list(input.datasource(), input.main_category(), input.sub_category())
+        return (
+            df.dropna(subset=["Number of Sites"])
+            .astype({"Number of Sites": int})
+            .sort_values("Number of Sites", ascending=False)
+        )
 
-        # MHVillage logic
-        if input.datasource() == "MHVillage":
-            if input.main_category() == "County":
-                df = mhvillage_df[
-                    mhvillage_df["County"] == input.sub_category()
-                ][["Name", "Sites", "FullstreetAddress"]]
-            else:
-                df = mhvillage_df[
-                    mhvillage_df[input.main_category()]
-                    == int(float(input.sub_category()))
-                ][["Name", "Sites", "FullstreetAddress"]]
-
-            df = df.rename(
-                columns={
-                    "Sites": "Number of Sites",
-                    "FullstreetAddress": "Address",
-                }
-            )
-            df = df[["Name", "Address", "Number of Sites"]]
-            df = (
-                df.dropna(subset=["Number of Sites"])
-                .astype({"Number of Sites": int})
-                .sort_values("Number of Sites", ascending=False)
-            )
-            return df
-
-        # LARA logic
-        else:
-            if input.main_category() == "County":
-                df = lara_df[
-                    lara_df[input.main_category()] == input.sub_category()
-                ][["DBA", "Owner / Community_Name", "Total_#_Sites", "Location_Address"]]
-            else:
-                district = int(float(input.sub_category()))
-                df = lara_df[
-                    lara_df[input.main_category()] == district
-                ][["DBA", "Owner / Community_Name", "Total_#_Sites", "Location_Address"]]
-
-            # Combine DBA + Owner/Community
-            df["Name"] = df.apply(
-                lambda x: x["DBA"]
-                if pd.notnull(x["DBA"]) and x["DBA"].strip() != ""
-                else x["Owner / Community_Name"],
-                axis=1,
-            )
-
-            df = df.drop(columns=["DBA", "Owner / Community_Name"])
-            df.columns = df.columns.str.replace("_", " ")
-
-            df = df.rename(
-                columns={
-                    "Total # Sites": "Number of Sites",
-                    "Location Address": "Address",
-                }
-            )
-
-            df = df[["Name", "Address", "Number of Sites"]]
-            df = (
-                df.dropna(subset=["Number of Sites"])
-                .astype({"Number of Sites": int})
-                .sort_values("Number of Sites", ascending=False)
-            )
-            return df
+    @reactive.Calc
+    def site_summary():
+        return region_summary(
+            input.datasource(), input.main_category(), input.sub_category()
+        )
 
     # -----------------------------
     # Table output
@@ -201,9 +200,7 @@ def server(input, output, session):
     @output
     @render.table
     def site_list_summary():
-        df = reactive_site_list()
-        num_mhcs = len(df)
-        num_sites = pd.to_numeric(df["Number of Sites"], errors="coerce").sum()
+        num_mhcs, num_sites = site_summary()
 
         summary_df = pd.DataFrame(
             {
@@ -222,8 +219,7 @@ def server(input, output, session):
         df = reactive_site_list()
 
         # Summary section
-        num_mhcs = len(df)
-        num_sites = pd.to_numeric(df["Number of Sites"], errors="coerce").sum()
+        num_mhcs, num_sites = site_summary()
 
         summary_df = pd.DataFrame(
             {
@@ -244,18 +240,14 @@ def server(input, output, session):
     @output
     @render.download(filename=lambda: "MHVillageDec7_Legislative1.csv")
     def download_mhvillage():
-        output_stream = io.StringIO()
-        mhvillage_df.to_csv(output_stream, index=False)
-        output_stream.seek(0)
-        return output_stream.getvalue(), ""
+        # The source CSV as published, not the schema-converted frame.
+        return str(TABLES["mhvillage"][0])
 
     @output
     @render.download(filename=lambda: "LARA_with_coord_and_legislativedistrict1.csv")
     def download_lara():
-        output_stream = io.StringIO()
-        lara_df.to_csv(output_stream, index=False)
-        output_stream.seek(0)
-        return output_stream.getvalue(), ""
+        # The source CSV as published, not the schema-converted frame.
+        return str(TABLES["lara"][0])
 
     @output
     @render.download(filename=lambda: "Michigan_State_House_Districts_2021.json")
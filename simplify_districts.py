@@ -0,0 +1,127 @@
+"""
+Writes simplified copies of the legislative district boundaries for the map.
+
+Every level in data_store.DISTRICT_LEVELS gets one GeoJSON file per chamber:
+    1) Simplify the districts as a coverage, so neighbouring districts keep
+       sharing the same edge (no gaps or slivers between them)
+    2) Quantize the coordinates to the level's number of decimals
+    3) Keep only the properties the app reads
+
+Run with no arguments to rebuild the Michigan files used by the app:
+    python simplify_districts.py
+or point it at another boundary set, e.g. the Illinois plans:
+    python simplify_districts.py "dataIL/Senate Plan.shp" dataIL/simplified/senate --keep ID DISTRICT
+"""
+
+# -----------------------------
+# Imports
+# -----------------------------
+import argparse
+import json
+import time
+from pathlib import Path
+
+import geopandas as gpd
+import shapely
+
+from data_store import (
+    DISTRICT_LEVELS,
+    house_districts_geojson_path,
+    senate_districts_geojson_path,
+    simplified_dir,
+)
+
+MI_PROPERTIES = ["NAME", "LABEL", "LEGISLATOR", "PARTY", "URL"]
+
+
+# -----------------------------
+# Simplification
+# -----------------------------
+def simplify_coverage(geometries, tolerance):
+    """Topology-preserving simplification of a set of adjoining polygons."""
+    if hasattr(shapely, "coverage_simplify"):
+        return shapely.coverage_simplify(geometries, tolerance)
+    # Older GEOS: each polygon stays valid, but shared edges may drift apart.
+    return shapely.simplify(geometries, tolerance, preserve_topology=True)
+
+
+def simplify_level(gdf, tolerance):
+    out = gdf.copy()
+    out.geometry = simplify_coverage(out.geometry.values, tolerance)
+    return out
+
+
+def _encode(gdf, decimals):
+    # Rounding every coordinate the same way keeps shared edges identical.
+    data = json.loads(gdf.to_json(drop_id=True), parse_float=lambda x: round(float(x), decimals))
+    return json.dumps(data, separators=(",", ":"))
+
+
+def write_levels(source, out_prefix, properties=None):
+    """Write `<out_prefix>_<level>.json` for every level and return one report
+    row per level (plus the full-resolution source for comparison)."""
+    gdf = gpd.read_file(source).to_crs(4326)
+    if properties:
+        gdf = gdf[properties + ["geometry"]]
+
+    out_prefix = Path(out_prefix)
+    out_prefix.parent.mkdir(parents=True, exist_ok=True)
+
+    full_text = gdf.to_json(drop_id=True)
+    rows = [_report_row("full", gdf, len(full_text.encode()), 0.0, full_text)]
+    for level, spec in DISTRICT_LEVELS.items():
+        start = time.perf_counter()
+        simplified = simplify_level(gdf, spec["tolerance"])
+        text = _encode(simplified, spec["decimals"])
+        build_seconds = time.perf_counter() - start
+
+        path = out_prefix.with_name(f"{out_prefix.name}_{level}.json")
+        path.write_text(text)
+        rows.append(_report_row(level, simplified, len(text.encode()), build_seconds, text))
+    return rows
+
+
+def _report_row(level, gdf, nbytes, build_seconds, text):
+    # Decoding the payload is the part of a map render that grows with its size.
+    start = time.perf_counter()
+    json.loads(text)
+    decode_seconds = time.perf_counter() - start
+    return {
+        "level": level,
+        "vertices": int(shapely.get_num_coordinates(gdf.geometry.values).sum()),
+        "bytes": nbytes,
+        "build_s": round(build_seconds, 3),
+        "decode_s": round(decode_seconds, 4),
+    }
+
+
+def print_report(name, rows):
+    print(f"\n{name}")
+    print(f"{'level':<8}{'vertices':>10}{'bytes':>12}{'build_s':>10}{'decode_s':>10}")
+    for row in rows:
+        print(
+            f"{row['level']:<8}{row['vertices']:>10}{row['bytes']:>12}"
+            f"{row['build_s']:>10}{row['decode_s']:>10}"
+        )
+
+
+# -----------------------------
+# Driver Script
+# -----------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("source", nargs="?", help="boundary file (GeoJSON or shapefile)")
+    parser.add_argument("out_prefix", nargs="?", help="output path prefix, e.g. dataIL/simplified/senate")
+    parser.add_argument("--keep", nargs="*", help="properties to keep (default: all)")
+    args = parser.parse_args()
+
+    if args.source:
+        jobs = [(args.source, args.out_prefix or Path(args.source).with_suffix(""), args.keep)]
+    else:
+        jobs = [
+            (house_districts_geojson_path, simplified_dir / "house", MI_PROPERTIES),
+            (senate_districts_geojson_path, simplified_dir / "senate", MI_PROPERTIES),
+        ]
+
+    for source, out_prefix, keep in jobs:
+        print_report(source, write_levels(source, out_prefix, keep))
@@ -0,0 +1,114 @@
+# tile_server.py
+# Serves the district boundaries as Mapbox vector tiles (MVT) from an endpoint
+# mounted next to the Shiny app, so the browser only downloads the tiles in view.
+import math
+from functools import lru_cache
+
+import geopandas as gpd
+import shapely
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response
+from starlette.routing import Mount, Route
+
+from data_store import district_level, get
+
+try:
+    import mapbox_vector_tile
+except ImportError:  # the map falls back to GeoJSON layers
+    mapbox_vector_tile = None
+
+PREFIX = "/tiles"
+
+# tile layer name -> (boundary set in the data_store registry, properties kept)
+TILE_LAYERS = {
+    "house": ("house", ["LABEL", "NAME", "LEGISLATOR"]),
+    "senate": ("senate", ["LABEL", "NAME", "LEGISLATOR"]),
+}
+
+EXTENT = 4096
+# Geometry this far (in tile units) outside the tile is kept, so strokes
+# don't show seams at tile edges.
+BUFFER = 64
+MAX_ZOOM = 18
+
+_HALF_WORLD = math.pi * 6378137.0
+
+_mounted = False
+
+
+def tile_bounds(z, x, y):
+    """Web Mercator bounds (minx, miny, maxx, maxy) of tile z/x/y."""
+    size = 2 * _HALF_WORLD / 2**z
+    minx = -_HALF_WORLD + x * size
+    maxy = _HALF_WORLD - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+@lru_cache(maxsize=None)
+def _layer_source(layer, level):
+    """Boundaries of `layer` at a simplification level (None for full
+    resolution), projected to Web Mercator, with a spatial index."""
+    chamber, properties = TILE_LAYERS[layer]
+    data = get(f"{chamber}_geojson_{level}" if level else f"{chamber}_geojson")
+    gdf = gpd.GeoDataFrame.from_features(data["features"], crs=4326).to_crs(3857)
+    return gdf.geometry.values, gdf[properties].to_dict("records"), shapely.STRtree(gdf.geometry.values)
+
+
+@lru_cache(maxsize=4096)
+def render_tile(layer, z, x, y):
+    """Encoded MVT bytes for one tile; empty tiles encode to b""."""
+    geoms, properties, tree = _layer_source(layer, district_level(z))
+    bounds = tile_bounds(z, x, y)
+    pad = (bounds[2] - bounds[0]) * BUFFER / EXTENT
+    clip_box = (bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+
+    features = []
+    for i in tree.query(shapely.box(*clip_box)):
+        clipped = shapely.clip_by_rect(geoms[i], *clip_box)
+        if clipped.is_empty:
+            continue
+        features.append({"geometry": clipped, "properties": properties[i]})
+    if not features:
+        return b""
+
+    return mapbox_vector_tile.encode(
+        [{"name": layer, "features": features}],
+        default_options={"quantize_bounds": bounds, "extents": EXTENT},
+    )
+
+
+async def tile_endpoint(request):
+    layer = request.path_params["layer"]
+    z, x, y = (request.path_params[k] for k in ("z", "x", "y"))
+    if layer not in TILE_LAYERS or z > MAX_ZOOM or not (0 <= x < 2**z and 0 <= y < 2**z):
+        return Response(status_code=404)
+    # Rendering is CPU-bound; keep it off the event loop the Shiny sessions share.
+    content = await run_in_threadpool(render_tile, layer, z, x, y)
+    return Response(
+        content,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"Cache-Control": "public, max-age=86400"},
+    )
+
+
+tile_app = Starlette(routes=[Route("/{layer}/{z:int}/{x:int}/{y:int}.pbf", tile_endpoint)])
+
+
+def mount(shiny_app):
+    """Return an app serving `shiny_app` at / and the tiles under PREFIX. Without
+    mapbox_vector_tile installed this is `shiny_app` itself."""
+    global _mounted
+    if mapbox_vector_tile is None:
+        return shiny_app
+    _mounted = True
+    return Starlette(routes=[Mount(PREFIX, app=tile_app), Mount("/", app=shiny_app)])
+
+
+def is_mounted():
+    return _mounted
+
+
+def tile_url(layer):
+    # Relative, so it keeps working when the app is served below a path prefix.
+    return f"{PREFIX.lstrip('/')}/{layer}/{{z}}/{{x}}/{{y}}.pbf"
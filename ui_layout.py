@@ -14,8 +14,16 @@ layernames = [
     "Marker LARA",
     "Circle MHVillage (location only)",
     "Circle LARA (location only)",
+    "Cluster MHVillage (sized by number of sites)",
+    "Cluster LARA (sized by number of sites)",
     "Legislative districts (Michigan State Senate)",
     "Legislative districts (Michigan State House of Representatives)",
+    "House districts shaded by number of communities (LARA)",
+    "House districts shaded by number of sites (LARA)",
+    "House districts shaded by average rent (MHVillage)",
+    "Senate districts shaded by number of communities (LARA)",
+    "Senate districts shaded by number of sites (LARA)",
+    "Senate districts shaded by average rent (MHVillage)",
 ]
 
 app_ui = ui.page_fluid(
@@ -46,6 +54,10 @@ app_ui = ui.page_fluid(
                 """),
                   ui.input_select("basemap", "Choose a basemap:", choices=list(basemaps.keys())),
                   ui.input_selectize("layers", "Layers to visualize:", layernames, multiple=True, selected=None),
+                  ui.HTML("""<h2 style="font-size: 18px;"><br>Find My District</h2>"""),
+                  ui.input_text("address", "Enter a Michigan address:", placeholder="e.g. 201 N Washington Sq, Lansing, MI"),
+                  ui.input_action_button("find_district", "Find"),
+                  ui.output_ui("district_result"),
                   ),
         ui.column(7, output_widget("map", width="auto", height="600px",),
             ui.HTML("</h3> <p style='text-align: center; font-size: 16px;'><i> NOTE: Blue circles are MHC's reported by LARA, orange circles are reported by MHVillage.</i></p>"),),